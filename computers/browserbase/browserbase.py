@@ -11,17 +11,127 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import atexit
 import os
-import sys
+import threading
+import time
+import browserbase
 import termcolor
+from typing import Optional
 from ..playwright.playwright import PlaywrightComputer
+from playwright.sync_api import Playwright, sync_playwright
+
+# Elements Cloudflare renders while an anti-bot challenge is running.
+CLOUDFLARE_CHALLENGE_SELECTOR = (
+    'iframe[src*="challenges.cloudflare.com"], #cf-chl-widget, #cf-challenge-running'
+)
+ANTI_BOT_MAX_WAIT_S = 10
+
+# Browserbase settings are read once at import. They are only validated when a
+# session is created, so the Playwright environment works without them.
+_API_KEY = os.environ.get("BROWSERBASE_API_KEY")
+_PROJECT_ID = os.environ.get("BROWSERBASE_PROJECT_ID")
+_EXTENSION_ID = os.environ.get("BROWSERBASE_EXTENSION_ID")
+
+# Sync Playwright drivers are bound to the thread that started them, so the
+# pool keeps one driver per thread.
+_playwright_pool = threading.local()
+
+
+def get_playwright() -> Playwright:
+    """Returns this thread's Playwright driver, starting it on first use.
+
+    Starting a driver launches a Node subprocess, so sessions opened one after
+    another on the same thread share it. The main thread's driver is stopped
+    at exit; other threads call `stop_playwright` when they are done.
+    """
+    playwright = getattr(_playwright_pool, "playwright", None)
+    if playwright is None:
+        playwright = sync_playwright().start()
+        _playwright_pool.playwright = playwright
+        if threading.current_thread() is threading.main_thread():
+            atexit.register(stop_playwright)
+    return playwright
+
+
+def stop_playwright():
+    """Stops this thread's pooled Playwright driver, if it has one."""
+    playwright = getattr(_playwright_pool, "playwright", None)
+    if playwright is not None:
+        _playwright_pool.playwright = None
+        playwright.stop()
+
+
+def _require(value: Optional[str], name: str) -> str:
+    if not value:
+        raise ValueError(f"{name} must be set to create a Browserbase session.")
+    return value
+
+
+def _browserbase_client():
+    return browserbase.Browserbase(
+        api_key=_require(_API_KEY, "BROWSERBASE_API_KEY"),
+        timeout=60.0  # Increase timeout to 60 seconds for slow connections
+    )
+
+
+def create_session(screen_size: tuple[int, int]):
+    """Creates a Browserbase session whose viewport matches `screen_size`.
+
+    The returned session's `connect_url` can be handed to any number of
+    `BrowserbaseComputer`s, each of which opens its own browser context in it.
+    """
+    session_params = {
+        "project_id": _require(_PROJECT_ID, "BROWSERBASE_PROJECT_ID"),
+        "proxies": True,  # Already uses residential IPs
+        "keep_alive": True,
+        "timeout": 900,  # Increased to 15 minutes for long-running queries
+        "browser_settings": {
+            # DEVELOPER PLAN: Block ads to reduce fingerprinting surface
+            "block_ads": True,
+
+            # DEVELOPER PLAN: Auto-solve captchas (enabled by default)
+            "solve_captchas": True,
+
+            # DEVELOPER PLAN: Enable session recording for debugging
+            "record_session": True,
+            "log_session": True,
+
+            # DEVELOPER PLAN: Optimized fingerprinting for ChatGPT
+            "fingerprint": {
+                "screen": {
+                    "maxWidth": 1920,
+                    "maxHeight": 1080,
+                    "minWidth": 1280,  # More realistic desktop minimum
+                    "minHeight": 800,
+                },
+                "browsers": ["chrome"],  # Single browser type for consistency
+                "operatingSystems": ["windows", "macos"],  # Most common desktop
+                "locales": ["en-US"],  # Single locale to appear more natural
+                "httpVersion": 2,
+                "devices": ["desktop"],  # Explicitly desktop
+            },
+            "viewport": {
+                "width": screen_size[0],
+                "height": screen_size[1],
+            },
+        }
+    }
+
+    # Add extension_id only if it exists
+    if _EXTENSION_ID:
+        session_params["extension_id"] = _EXTENSION_ID
+
+    return _browserbase_client().sessions.create(**session_params)
 
-# Fix for Windows event loop policy - set before any imports that might use asyncio
-if sys.platform == 'win32':
-    import asyncio
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-from playwright.sync_api import sync_playwright
+def release_session(session_id: str):
+    """Ends a keep-alive session created by `create_session`."""
+    _browserbase_client().sessions.update(
+        session_id,
+        project_id=_require(_PROJECT_ID, "BROWSERBASE_PROJECT_ID"),
+        status="REQUEST_RELEASE",
+    )
 
 
 class BrowserbaseComputer(PlaywrightComputer):
@@ -29,79 +139,46 @@ class BrowserbaseComputer(PlaywrightComputer):
         self,
         screen_size: tuple[int, int],
         initial_url: str = "https://www.google.com",
+        connect_url: Optional[str] = None,
     ):
+        """If `connect_url` is given, attaches to that existing session in a
+        fresh browser context instead of creating a session of its own."""
         super().__init__(screen_size, initial_url)
+        self._connect_url = connect_url
+        self._session = None
 
     def __enter__(self):
         print("Creating session...")
 
-        self._playwright = sync_playwright().start()
+        self._playwright = get_playwright()
 
-        import browserbase
-        self._browserbase = browserbase.Browserbase(
-            api_key=os.environ["BROWSERBASE_API_KEY"],
-            timeout=60.0  # Increase timeout to 60 seconds for slow connections
-        )
-
-        # Get extension ID if available, otherwise use None
-        extension_id = os.environ.get("BROWSERBASE_EXTENSION_ID")
-
-        session_params = {
-            "project_id": os.environ["BROWSERBASE_PROJECT_ID"],
-            "proxies": True,  # Already uses residential IPs
-            "keep_alive": True,
-            "timeout": 900,  # Increased to 15 minutes for long-running queries
-            "browser_settings": {
-                # DEVELOPER PLAN: Block ads to reduce fingerprinting surface
-                "block_ads": True,
-
-                # DEVELOPER PLAN: Auto-solve captchas (enabled by default)
-                "solve_captchas": True,
-
-                # DEVELOPER PLAN: Enable session recording for debugging
-                "record_session": True,
-                "log_session": True,
-
-                # DEVELOPER PLAN: Optimized fingerprinting for ChatGPT
-                "fingerprint": {
-                    "screen": {
-                        "maxWidth": 1920,
-                        "maxHeight": 1080,
-                        "minWidth": 1280,  # More realistic desktop minimum
-                        "minHeight": 800,
-                    },
-                    "browsers": ["chrome"],  # Single browser type for consistency
-                    "operatingSystems": ["windows", "macos"],  # Most common desktop
-                    "locales": ["en-US"],  # Single locale to appear more natural
-                    "httpVersion": 2,
-                    "devices": ["desktop"],  # Explicitly desktop
-                },
-                "viewport": {
+        if self._connect_url:
+            self._browser = self._playwright.chromium.connect_over_cdp(
+                self._connect_url
+            )
+            self._context = self._browser.new_context(
+                viewport={
                     "width": self._screen_size[0],
                     "height": self._screen_size[1],
-                },
-            }
-        }
-
-        # Add extension_id only if it exists
-        if extension_id:
-            session_params["extension_id"] = extension_id
-
-        self._session = self._browserbase.sessions.create(**session_params)
-
-        self._browser = self._playwright.chromium.connect_over_cdp(
-            self._session.connect_url
-        )
-        self._context = self._browser.contexts[0]
+                }
+            )
+        else:
+            self._session = create_session(self._screen_size)
+            self._browser = self._playwright.chromium.connect_over_cdp(
+                self._session.connect_url
+            )
+            self._context = self._browser.contexts[0]
         self._context.set_default_timeout(120000)  # 120 seconds for Cloudflare
         self._context.set_default_navigation_timeout(120000)
 
         # Grant permissions for better OAuth handling
         self._context.grant_permissions(['geolocation', 'notifications'])
 
-        self._page = self._context.pages[0]
-        self._page.set_default_timeout(120000)
-        self._page.set_default_navigation_timeout(120000)
+        if self._connect_url:
+            self._page = self._context.new_page()
+        else:
+            self._page = self._context.pages[0]
+        # The page inherits the default timeouts set on its context above.
 
         # Navigate with less strict requirements
         try:
@@ -110,13 +187,27 @@ class BrowserbaseComputer(PlaywrightComputer):
             print(f"Initial navigation warning: {e}")
             # Continue anyway, the page might still load
 
-        # Wait for potential Cloudflare challenges to complete
-        import time
-        print("Waiting for any anti-bot challenges to complete...")
-        time.sleep(10)
-
         self._context.on("page", self._handle_new_page)
 
+        # Wait for potential Cloudflare challenges to complete, but only for as
+        # long as a challenge is actually present on the page.
+        print("Checking for anti-bot challenges...")
+        for _ in range(ANTI_BOT_MAX_WAIT_S):
+            try:
+                if not self._page.query_selector(CLOUDFLARE_CHALLENGE_SELECTOR):
+                    break
+            except Exception:
+                pass  # The challenge may be navigating the page; check again
+            time.sleep(1)
+
+        if self._connect_url:
+            termcolor.cprint(
+                "Attached new context to shared session.",
+                color="green",
+                attrs=["bold"],
+            )
+            return self
+
         termcolor.cprint(
             f"Session started at https://browserbase.com/sessions/{self._session.id}",
             color="green",
@@ -132,5 +223,4 @@ class BrowserbaseComputer(PlaywrightComputer):
 
         if self._browser:
             self._browser.close()
-
-        self._playwright.stop()
+        # The driver is pooled per thread; see get_playwright.
@@ -7,11 +7,22 @@ No external AI (Gemini) needed - just direct DOM manipulation.
 import sys
 import asyncio
 import argparse
+import base64
+import contextlib
+import hashlib
 import os
 import json
+import queue
+import logging
+import operator
+import tempfile
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import pydantic
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -19,83 +30,596 @@ load_dotenv()
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
-# Windows event loop fix
-if sys.platform == 'win32':
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+# Use the libuv-based event loop when it is installed (winloop on Windows,
+# uvloop elsewhere); otherwise keep the Proactor loop on Windows, which
+# Playwright needs to spawn its driver subprocess.
+try:
+    if sys.platform == 'win32':
+        import winloop
+        asyncio.set_event_loop_policy(winloop.EventLoopPolicy())
+    else:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ModuleNotFoundError:
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+# orjson is a faster drop-in for writing results; fall back to json without it.
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from computers import BrowserbaseComputer, PlaywrightComputer
+from computers.browserbase.browserbase import (
+    create_session,
+    release_session,
+    stop_playwright,
+)
+
+logger = logging.getLogger(__name__)
 
 SCREEN_SIZE = (1440, 900)
 
+# Separator line around the banners and per-service summaries.
+_BANNER = "=" * 60
+
+# Attempts per service when query_service fails on a dropped connection, and
+# the delay before the first retry (doubled for each one after it).
+MAX_ATTEMPTS = 2
+RETRY_BACKOFF_S = 1.0
+_TRANSIENT_ERROR_MARKERS = (
+    "net::ERR_",
+    "ECONNRESET",
+    "ECONNREFUSED",
+    "Connection closed",
+    "WebSocket",
+)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "query_fanout")
+
+# Perplexity's SSE frames carry a `"related_queries": [...]` array of strings.
+_RQ_KEY = b'related_queries":'
+
+# How much new SSE data to accumulate before rescanning for related_queries.
+SSE_SCAN_STEP = 64 * 1024
+
 SERVICES = {
     "chatgpt": {
         "url": "https://chatgpt.com/",
-        "name": "ChatGPT"
+        "name": "ChatGPT",
+        # One selector list: Playwright resolves whichever variant is present
+        "input_selector": '#prompt-textarea, textarea[data-id="root"], textarea[placeholder*="Ask"], textarea',
     },
     "perplexity": {
         "url": "https://www.perplexity.ai/",
-        "name": "Perplexity"
+        "name": "Perplexity",
+        # The primary '#ask-input' and its fallbacks in a single selector list
+        "input_selector": '#ask-input, textarea[placeholder*="Ask"], textarea, [contenteditable="true"]',
     }}
 
-def submit_chatgpt_query(page, query: str) -> bool:
-    """Submit a query to ChatGPT using Playwright with web search enabled."""
+
+# Page-side JS is kept in module constants so each payload is defined once.
+# The polling probes are installed as `window` functions in every page of a
+# service's context (see `install_page_probes`), so each poll ships a short
+# call instead of the full script source.
+_RESPONSE_PROBE_JS = """
+window.__probeResponse = () => {
+    // Check if the stop button is visible (means it's generating)
+    const stopButton = document.querySelector('button[aria-label*="Stop"]');
+    const isGenerating = stopButton && stopButton.offsetParent !== null;
+
+    // Check if there's response content
+    const hasResponse = document.querySelectorAll('[data-message-author-role="assistant"]').length > 0;
+
+    return {
+        isGenerating: isGenerating,
+        hasResponse: hasResponse
+    };
+};
+
+window.__perplexityState = () => {
+    // Check for the stop/generating button (means still generating)
+    const stopBtn = document.querySelector('button[aria-label*="Stop"], button[aria-label*="stop"]');
+    const isGenerating = stopBtn && stopBtn.offsetParent !== null;
+
+    // Check for loading/spinner indicators
+    const hasSpinner = document.querySelector('[class*="animate-spin"], [class*="loading"], svg[class*="animate"]') !== null;
+
+    // Look for the answer content in various places. textContent is used
+    // rather than innerText so polling never forces a layout.
+    let contentLength = 0;
+    let container = null;
+    const contentSelectors = [
+        '[class*="prose"]',
+        '[class*="markdown"]',
+        '[data-testid*="answer"]',
+        'article',
+        'main'
+    ];
+
+    for (const sel of contentSelectors) {
+        const el = document.querySelector(sel);
+        if (el) {
+            const len = el.textContent.length;
+            if (len > contentLength) {
+                contentLength = len;
+                container = el;
+            }
+        }
+    }
+
+    // Count mutations under the answer container; the answer is settled once
+    // the count stops moving.
+    window.__mo ||= new MutationObserver(() => { window.__mut = (window.__mut || 0) + 1; });
+    if (container && window.__moTarget !== container) {
+        window.__mo.disconnect();
+        window.__mo.observe(container, { childList: true, subtree: true, characterData: true });
+        window.__moTarget = container;
+    }
+
+    // Check for "related" section which appears after answer is done
+    const hasRelated = document.querySelector('[class*="related"], [class*="Related"]') !== null;
+
+    // Check for sources/citations
+    const sourceCount = document.querySelectorAll('[class*="citation"], [class*="source"] a, a[href^="http"]').length;
+
+    return {
+        isGenerating: isGenerating || hasSpinner,
+        contentLength: contentLength,
+        mut: window.__mut || 0,
+        hasRelated: hasRelated,
+        sourceCount: sourceCount
+    };
+};
+"""
+
+_CHATGPT_DONE_JS = """
+() => {
+    const state = window.__probeResponse && window.__probeResponse();
+    return !!state && state.hasResponse && !state.isGenerating;
+}
+"""
+
+# Stability is tracked on `window.__stableState` between polls: the answer is
+# stable while the mutation count under it holds still. At a 500ms polling
+# interval, six unchanged samples keep the original ~3s settle window.
+# Returns the completion reason so the caller can report it. The CDP capture
+# sets `window.__sseRelatedReady` once the related queries have streamed in,
+# and `window.__sseDone` once the SSE stream has finished.
+_PERPLEXITY_DONE_JS = """
+() => {
+    const state = window.__perplexityState && window.__perplexityState();
+    if (!state) return false;
+    if (window.__sseRelatedReady || window.__sseDone) {
+        return { reason: 'sse', contentLength: state.contentLength, sourceCount: state.sourceCount };
+    }
+    const st = window.__stableState || (window.__stableState = { lastMut: -1, stable: 0 });
+    if (state.mut === st.lastMut && state.contentLength > 200) {
+        st.stable += 1;
+    } else {
+        st.stable = 0;
+    }
+    st.lastMut = state.mut;
+    if (!state.isGenerating && state.contentLength > 500 && st.stable >= 6) {
+        return { reason: 'stable', contentLength: state.contentLength, sourceCount: state.sourceCount };
+    }
+    if (state.hasRelated && state.contentLength > 300) {
+        return { reason: 'related', contentLength: state.contentLength, sourceCount: state.sourceCount };
+    }
+    return false;
+}
+"""
+
+# `window.__domQuiet` resolves `true` once the page has gone `quietMs` without
+# a DOM mutation, or `false` if it is still changing after `maxMs`.
+_DOM_QUIET_JS = """
+window.__domQuiet = ([quietMs, maxMs]) => new Promise(resolve => {
+    let quietTimer = null;
+    let maxTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(() => finish(true), quietMs);
+    });
+    const finish = (quiet) => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(maxTimer);
+        resolve(quiet);
+    };
+    observer.observe(document.body, { childList: true, subtree: true, characterData: true });
+    quietTimer = setTimeout(() => finish(true), quietMs);
+    maxTimer = setTimeout(() => finish(false), maxMs);
+});
+"""
+
+# Debug info and extraction are gathered in a single evaluate; the debug pass
+# only runs when the `debug` argument is true.
+_CHATGPT_EXTRACT_JS = r"""
+window.__extractChatgpt = (debug) => {
+    // Snapshot the page text once. This needs innerText: textContent runs
+    // adjacent elements together, which breaks the "Searched N sites" match,
+    // and includes script and style text.
+    const bodyText = document.body.innerText || '';
+    const bodyTextLower = bodyText.toLowerCase();
+
+    const SEARCHED_SITES_RE = /Searched\s+\d+\s+sites?/i;
+    const QUERY_PATTERNS = [
+        /(?:searched for|searching for|I'll search for)[:\s]+["']([^"']+)["']/gi,
+        /(?:query|queries)[:\s]+["']([^"']+)["']/gi,
+        /\[Search:\s*([^\]]+)\]/gi
+    ];
+
+    const gatherDebug = () => {
+        const allClassNames = [];
+        const candidates = document.querySelectorAll('[class*="search"], [class*="query"], [class*="source"], [data-testid]');
+        for (let i = 0; i < candidates.length && allClassNames.length < 20; i++) {
+            const el = candidates[i];
+            allClassNames.push({
+                tag: el.tagName,
+                className: el.className,
+                text: el.innerText?.substring(0, 50),
+                testId: el.getAttribute('data-testid')
+            });
+        }
+
+        return {
+            hasSearchIndicator: document.querySelector('[class*="search"]') !== null,
+            hasSearchedText: bodyTextLower.includes('searched'),
+            allClassNames,
+            citationCount: document.querySelectorAll('sup, [class*="citation"]').length,
+            linkCount: document.querySelectorAll('a[href^="http"]').length
+        };
+    };
+
+    const gatherExtraction = () => {
+        try {
+            const queries = [];
+            const MAX_SOURCES = 10;
+            const citationSources = [];
+            const linkSources = [];
+            const seenUrls = new Set();
+            let lastAssistantMessage = null;
+
+            // Classify every element in a single walk instead of running one
+            // querySelectorAll per kind of element.
+            const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT);
+            let node;
+            while ((node = walker.nextNode())) {
+                // The assistant's messages; the last one is the response
+                if (node.getAttribute('data-message-author-role') === 'assistant') {
+                    lastAssistantMessage = node;
+                    continue;
+                }
+
+                // Walk the external links once. Links inside a citation (these
+                // appear when ChatGPT uses web search) are listed ahead of the
+                // other external links in the response. Once there are enough
+                // citations the other links are never returned.
+                if (node.tagName === 'A') {
+                    const href = node.getAttribute('href') || '';
+                    if (!href.startsWith('http') || citationSources.length >= MAX_SOURCES) {
+                        continue;
+                    }
+                    const url = node.href;
+                    // Filter out ChatGPT's own links
+                    if (!url || seenUrls.has(url) || url.includes('chatgpt.com')) {
+                        continue;
+                    }
+
+                    if (node.closest('sup, [class*="citation"], [data-testid*="citation"]')) {
+                        const text = node.getAttribute('title') || node.innerText || '';
+                        citationSources.push({
+                            title: text.substring(0, 100) || 'Source',
+                            url: url
+                        });
+                    } else if (linkSources.length < MAX_SOURCES && !url.includes('openai.com')) {
+                        const title = node.innerText?.trim() || node.getAttribute('aria-label') || url;
+                        linkSources.push({
+                            title: title.substring(0, 100),
+                            url: url
+                        });
+                    } else {
+                        continue;
+                    }
+                    seenUrls.add(url);
+                    continue;
+                }
+
+                // The web search UI elements (ChatGPT shows "Searched X sites" when using web search)
+                const className = node.getAttribute('class') || '';
+                const ariaLabel = node.getAttribute('aria-label') || '';
+                const testId = node.getAttribute('data-testid') || '';
+                if (
+                    className.includes('SearchStatus') || className.includes('search-status') ||
+                    ariaLabel.includes('search') || testId.includes('search') ||
+                    (node.tagName === 'BUTTON' && ariaLabel.includes('Searched'))
+                ) {
+                    const text = node.innerText?.trim() || ariaLabel;
+                    if (text && (text.includes('Searched') || text.includes('sites'))) {
+                        queries.push(text);
+                    }
+                }
+            }
+
+            // Extract the assistant's response text
+            const responseText = lastAssistantMessage ? (lastAssistantMessage.innerText || '') : '';
+
+            // Look for search queries in the full page text
+            if (bodyTextLower.includes('searched')) {
+                // Extract the "Searched X sites" pattern
+                const searchedMatch = bodyText.match(SEARCHED_SITES_RE);
+                if (searchedMatch) {
+                    queries.push(searchedMatch[0]);
+                }
+            }
+
+            // Try to extract queries from the response content
+            QUERY_PATTERNS.forEach(pattern => {
+                let match;
+                while ((match = pattern.exec(responseText)) !== null) {
+                    if (match[1] && match[1].trim().length > 3) {
+                        queries.push(match[1].trim());
+                    }
+                }
+            });
+
+            const sourcesList = citationSources.concat(linkSources);
+
+            return {
+                queries: [...new Set(queries)].slice(0, 10),
+                response: responseText.substring(0, 2000),
+                sources: sourcesList.slice(0, MAX_SOURCES),
+                error: null
+            };
+        } catch (error) {
+            console.error("Extraction error:", error);
+            return {
+                error: error.toString(),
+                queries: [],
+                response: '',
+                sources: []
+            };
+        }
+    };
+
+    return {
+        debug: debug ? gatherDebug() : null,
+        extraction: gatherExtraction()
+    };
+};
+"""
+
+_PERPLEXITY_EXTRACT_JS = """
+window.__extractPplx = () => {
+    // Answer containers in order of preference; the first element matching
+    // each one is remembered and checked once the walk is done.
+    const answerMatchers = [
+        (el, cls) => cls.includes('prose'),
+        (el, cls) => cls.includes('Answer'),
+        (el, cls) => cls.includes('response'),
+        (el, cls) => el.tagName === 'ARTICLE',
+        (el, cls) => cls.includes('markdown') && el.closest('main') !== null
+    ];
+    const answerCandidates = new Array(answerMatchers.length).fill(null);
+
+    // Related queries - Perplexity shows these at the bottom, sometimes as
+    // suggestion or follow-up sections, sometimes as question buttons
+    const isRelatedElement = (el, cls) => (
+        (el.tagName === 'BUTTON' && (
+            el.closest('[class*="related"], [class*="Related"]') !== null ||
+            cls.includes('query')
+        )) ||
+        cls.includes('suggestion') || cls.includes('Suggestion') ||
+        cls.includes('follow-up') || cls.includes('FollowUp')
+    );
+    const MAX_RELATED = 10;
+    const relatedQueries = [];
+    const questionQueries = [];
+    const seenRelated = new Set();
+    const seenQuestions = new Set();
+
+    // Sources/citations, stopping at the first 15 matches
+    const sources = [];
+
+    // Classify every element in a single walk instead of one
+    // querySelectorAll per selector
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT);
+    let el;
+    while ((el = walker.nextNode())) {
+        const cls = el.getAttribute('class') || '';
+
+        for (let i = 0; i < answerMatchers.length; i++) {
+            if (answerCandidates[i] === null && answerMatchers[i](el, cls)) {
+                answerCandidates[i] = el;
+            }
+        }
+
+        if (el.tagName === 'A') {
+            const href = el.href;
+            if (sources.length >= 15 || !(el.getAttribute('href') || '').startsWith('http')) {
+                continue;
+            }
+            if (!href || href.includes('perplexity.ai') || href.includes('google.com')) {
+                continue;
+            }
+            const title = el.textContent.trim();
+            if (title.length > 0) {
+                sources.push({ url: href, title: title.substring(0, 100) });
+            }
+            continue;
+        }
+
+        // Related sections are listed first, so once they fill the result
+        // no other text is needed
+        if (relatedQueries.length >= MAX_RELATED) {
+            continue;
+        }
+        const isRelated = isRelatedElement(el, cls);
+        const isButton = el.tagName === 'BUTTON' || el.getAttribute('role') === 'button';
+        if (!isRelated && !isButton) {
+            continue;
+        }
+
+        // innerText forces layout, so read it once per element
+        const text = el.innerText?.trim();
+        if (!text) {
+            continue;
+        }
+        if (isRelated && text.length > 10 && text.length < 200 && !seenRelated.has(text)) {
+            relatedQueries.push(text);
+            seenRelated.add(text);
+        }
+        // Also look for any buttons/links that look like questions
+        if (isButton && text.includes('?') && text.length > 15 && text.length < 150 && !seenQuestions.has(text)) {
+            questionQueries.push(text);
+            seenQuestions.add(text);
+        }
+    }
+
+    let answer = "";
+    for (const el of answerCandidates) {
+        if (el && el.innerText.length > 50) {
+            answer = el.innerText;
+            break;
+        }
+    }
+
+    // Both lists are already unique; drop questions also found as related
+    const uniqueRelated = relatedQueries.concat(questionQueries.filter(q => !seenRelated.has(q)));
+
+    return {
+        answer: answer.substring(0, 3000),
+        sources,
+        relatedQueries: uniqueRelated.slice(0, MAX_RELATED)
+    };
+};
+"""
+
+
+# Everything installed by install_page_probes; pages are tracked weakly so a
+# closed page drops out of the set on its own.
+_PAGE_FUNCTIONS_JS = "\n".join((
+    _RESPONSE_PROBE_JS,
+    _DOM_QUIET_JS,
+    _CHATGPT_EXTRACT_JS,
+    _PERPLEXITY_EXTRACT_JS,
+))
+# The same script for page.evaluate. Evaluating the bare script would yield
+# the last function it assigns, which Playwright would then call; wrapping it
+# makes the evaluate only install the functions.
+_INSTALL_PAGE_FUNCTIONS_JS = "() => {\n" + _PAGE_FUNCTIONS_JS + "\n}"
+_PROBED_PAGES = weakref.WeakSet()
+
+
+def install_page_probes(page):
+    """
+    Install the polling probes and extractors on the current page and any later
+    navigation, so later calls only send the short `window.__*` invocations.
+    """
+    if page in _PROBED_PAGES:
+        return
+    page.context.add_init_script(_PAGE_FUNCTIONS_JS)
+    page.evaluate(_INSTALL_PAGE_FUNCTIONS_JS)
+    _PROBED_PAGES.add(page)
+
+
+def wait_for_dom_quiet(page, quiet_ms=500, max_wait_ms=5000) -> bool:
+    """
+    Wait until the page has stopped changing for `quiet_ms`.
+
+    Returns False if the DOM is still mutating after `max_wait_ms`.
+    """
     try:
-        print("Submitting query to ChatGPT...")
+        install_page_probes(page)
+        return page.evaluate("(args) => window.__domQuiet(args)", [quiet_ms, max_wait_ms])
+    except Exception as e:
+        print(f"  Could not check DOM activity: {e}")
+        return False
 
-        time.sleep(3)
 
-        textarea_selectors = [
-            'textarea[placeholder*="Ask"]',
-            'textarea[data-id="root"]',
-            '#prompt-textarea',
-            'textarea',
-        ]
+class _SharedBrowserbaseSession:
+    """
+    One Browserbase session shared by every service in a fanout.
 
-        textarea = None
-        for selector in textarea_selectors:
-            try:
-                textarea = page.wait_for_selector(selector, timeout=5000)
-                if textarea:
-                    print(f"Found textarea with selector: {selector}")
-                    break
-            except:
-                continue
-
-        if not textarea:
-            print("Could not find textarea, trying to click in the center area")
-            page.click('body')
-            time.sleep(1)
-            textarea = page.query_selector('textarea')
+    The session is created on first use; each service then attaches to it with
+    its own browser context instead of paying for a session of its own.
+    """
 
-        if not textarea:
-            raise Exception("Could not find ChatGPT input textarea")
+    def __init__(self, screen_size: tuple):
+        self._screen_size = screen_size
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def connect_url(self) -> str:
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(self._screen_size)
+                print(f"Shared session started at https://browserbase.com/sessions/{self._session.id}")
+            return self._session.connect_url
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._session is None:
+            return
+        try:
+            release_session(self._session.id)
+        except Exception as e:
+            print(f"Failed to release shared session: {e}")
 
-        textarea.click()
-        time.sleep(0.5)
+def submit_chatgpt_query(page, query: str) -> bool:
+    """Submit a query to ChatGPT using Playwright with web search enabled."""
+    try:
+        print("Submitting query to ChatGPT...")
 
-        # Look for web search toggle button and enable it
-        web_search_selectors = [
-            'button[aria-label*="Search"]',
-            'button[aria-label*="search"]',
-            'button[data-testid*="search"]',
-            '[aria-label*="web"]',
-            'button:has(svg):near(textarea)',  # Button with icon near textarea
-        ]
+        # One selector list, so a missing variant no longer costs its own
+        # timeout. Locator actions auto-wait for the element to be visible
+        # and actionable.
+        textarea_selector = SERVICES['chatgpt']['input_selector']
+        textarea = page.locator(f'{textarea_selector} >> visible=true').first
 
-        for selector in web_search_selectors:
+        try:
+            textarea.click(timeout=8000)
+        except PlaywrightTimeoutError:
+            print("Could not find textarea, trying to click in the center area")
+            page.click('body')
+            textarea = page.locator('textarea').first
             try:
-                search_btn = page.query_selector(selector)
-                if search_btn:
-                    print(f"Found web search button: {selector}")
-                    search_btn.click()
-                    time.sleep(1)
-                    break
-            except:
-                continue
+                textarea.click(timeout=2000)
+            except PlaywrightTimeoutError:
+                raise Exception("Could not find ChatGPT input textarea")
 
-        textarea.fill(query)
-        time.sleep(0.5)
+        try:
+            page.wait_for_function(
+                "() => document.activeElement && (document.activeElement.tagName === 'TEXTAREA' || document.activeElement.isContentEditable)",
+                timeout=2000,
+            )
+        except PlaywrightTimeoutError:
+            pass  # fill() below focuses the input itself
+
+        # Look for web search toggle button and enable it. Selector lists
+        # match in document order, so the old catch-all ':near(textarea)'
+        # variant is left out; it would shadow the specific ones. The `i`
+        # flag covers both capitalisations of the aria-labels.
+        web_search_selector = (
+            'button[aria-label*="Search" i], button[data-testid*="search"], '
+            '[aria-label*="web" i]'
+        )
+        try:
+            page.locator(web_search_selector).first.click(timeout=2000)
+            print("Enabled web search")
+        except PlaywrightTimeoutError:
+            print("Could not find web search button")
+        except Exception as e:
+            print(f"Could not enable web search: {e}")
 
+        # fill() and press() wait for the input to be actionable
+        textarea.fill(query)
         textarea.press('Enter')
         print("Query submitted!")
 
@@ -110,19 +634,19 @@ def wait_for_cloudflare(page, max_wait=30) -> bool:
     """Wait for Cloudflare challenge to complete."""
     print("Checking for Cloudflare protection...")
 
-    for i in range(max_wait):
-        title = page.title().lower()
-
-        if "just a moment" in title or "checking" in title or "cloudflare" in title:
-            if i % 5 == 0:
-                print(f"  Waiting for Cloudflare... ({i}s)")
-            time.sleep(1)
-        else:
-            print(f"  Cloudflare passed! Page title: {page.title()}")
-            return True
+    # The title check runs inside the page, so the wait is a single round-trip
+    try:
+        page.wait_for_function(
+            "() => !/just a moment|checking|cloudflare/i.test(document.title)",
+            timeout=max_wait * 1000,
+            polling=1000,
+        )
+    except PlaywrightTimeoutError:
+        print("  Cloudflare timeout - proceeding anyway")
+        return False
 
-    print("  Cloudflare timeout - proceeding anyway")
-    return False
+    print(f"  Cloudflare passed! Page title: {page.title()}")
+    return True
 
 
 def submit_perplexity_query(page, query: str, captured_responses: list) -> bool:
@@ -140,49 +664,37 @@ def submit_perplexity_query(page, query: str, captured_responses: list) -> bool:
 
         wait_for_cloudflare(page, max_wait=30)
 
-        time.sleep(3)
+        input_selector = SERVICES['perplexity']['input_selector']
+        input_elem = page.locator(f'{input_selector} >> visible=true').first
 
         print(f"Page title: {page.title()}")
 
-        input_selector = '#ask-input'
-
-        input_elem = page.query_selector(input_selector)
-
-        if not input_elem:
-            print(f"Primary selector '{input_selector}' not found, trying alternatives...")
-            # Fallback selectors
-            fallback_selectors = [
-                'textarea[placeholder*="Ask"]',
-                'textarea',
-                '[contenteditable="true"]',
-            ]
-            for selector in fallback_selectors:
-                input_elem = page.query_selector(selector)
-                if input_elem:
-                    print(f"Found input with fallback selector: {selector}")
-                    break
-
-        if not input_elem:
+        # Locator actions auto-wait for the input to be visible and actionable
+        try:
+            input_elem.click(timeout=10000)
+        except PlaywrightTimeoutError:
             raise Exception("Could not find Perplexity input")
 
-        input_elem.click()
-        time.sleep(0.5)
-
         input_elem.fill(query)
         print(f"Typed query: {query}")
-        time.sleep(2)
+
+        # The submit button is enabled once the page has registered the input
+        submit_btn = page.locator('button[aria-label="Submit"]').first
+        try:
+            page.locator('button[aria-label="Submit"]:not([disabled])').first.wait_for(timeout=5000)
+        except PlaywrightTimeoutError:
+            pass
 
         try:
-            close_btn = page.query_selector('button[data-testid="floating-signup-close-button"]')
-            if close_btn:
+            close_btn = page.locator('button[data-testid="floating-signup-close-button"]').first
+            if close_btn.is_visible():
                 print("Closing signup popup...")
                 close_btn.click()
-                time.sleep(1)
+                close_btn.wait_for(state='hidden', timeout=2000)
         except:
             pass  # Popup might not appear
 
-        submit_btn = page.query_selector('button[aria-label="Submit"]')
-        if submit_btn:
+        if submit_btn.count():
             print("Clicking submit button...")
             submit_btn.click()
         else:
@@ -202,368 +714,275 @@ def setup_perplexity_cdp_capture(page) -> dict:
     """
     Set up CDP network capture to intercept Perplexity SSE responses.
     Uses Chrome DevTools Protocol similar to perplex_query.py
-    Returns a dict that will be populated with the request_id and responses.
+    The SSE body is streamed into a buffer as it arrives, and the returned dict
+    is populated with the request_id, the body and any related queries found.
     """
     capture_data = {
         'request_id': None,
-        'responses': []
+        'body': bytearray(),
+        'scanned': 0,
+        'related_queries': [],
+        'done': False,
     }
 
     # Get the CDP session from Playwright
     cdp = page.context.new_cdp_session(page)
 
-    # Enable network with large buffer for SSE streams (like perplex_query.py)
+    # Keep large buffers: whether Network.streamResourceContent is available is
+    # only known once the response arrives, and without it the whole stream
+    # must fit in the browser's buffer for the getResponseBody fallback.
     cdp.send("Network.enable", {
         "maxTotalBufferSize": 100000000,  # 100MB
         "maxResourceBufferSize": 50000000,  # 50MB
         "maxPostDataSize": 10000000,  # 10MB
     })
 
+    def signal_page(flag):
+        # Let wait_for_perplexity_response stop waiting on the DOM
+        try:
+            cdp.send("Runtime.evaluate", {"expression": f"window.{flag} = true"})
+        except Exception as e:
+            logger.debug("Could not set %s on the page: %s", flag, e)
+
+    def scan_body(force=False):
+        body = capture_data['body']
+        if not force and len(body) - capture_data['scanned'] < SSE_SCAN_STEP:
+            return
+        capture_data['scanned'] = len(body)
+        related_queries, complete = _scan_related_queries(bytes(body))
+        # Until the stream has finished, an array cut off at a chunk boundary
+        # is only the start of the list, so wait for its closing bracket.
+        if not related_queries or not (complete or force):
+            return
+        found_before = bool(capture_data['related_queries'])
+        capture_data['related_queries'] = related_queries
+        if not found_before:
+            signal_page("__sseRelatedReady")
+
     def on_response_received(params):
         url = params.get('response', {}).get('url', '')
         if '/rest/sse/perplexity_ask' in url:
             request_id = params.get('requestId')
             capture_data['request_id'] = request_id
             print(f"🎯 CDP captured perplexity_ask request: {request_id}")
+            # Chrome 124+: deliver the body through Network.dataReceived
+            try:
+                result = cdp.send("Network.streamResourceContent", {"requestId": request_id})
+                capture_data['body'] += base64.b64decode(result.get('bufferedData', ''))
+                scan_body()
+            except Exception as e:
+                logger.debug("Network.streamResourceContent unavailable: %s", e)
+
+    def on_data_received(params):
+        if params.get('requestId') != capture_data['request_id'] or not params.get('data'):
+            return
+        capture_data['body'] += base64.b64decode(params['data'])
+        scan_body()
+
+    def on_loading_finished(params):
+        if params.get('requestId') == capture_data['request_id']:
+            scan_body(force=True)
+            # The stream is complete, so the answer is final
+            capture_data['done'] = True
+            signal_page("__sseDone")
 
     # Listen for responses
     cdp.on("Network.responseReceived", on_response_received)
+    cdp.on("Network.dataReceived", on_data_received)
+    cdp.on("Network.loadingFinished", on_loading_finished)
 
     capture_data['cdp'] = cdp
     return capture_data
 
 
-def get_perplexity_sse_body(capture_data: dict) -> str:
+def get_perplexity_sse_body(capture_data: dict) -> bytes:
     """
-    Get the SSE response body using CDP after the response is complete.
+    Get the SSE response body, preferring the bytes streamed during capture.
     """
+    if capture_data.get('body'):
+        body = bytes(capture_data['body'])
+        print(f"✓ Got streamed SSE response body: {len(body)} bytes")
+        return body
+
     try:
         cdp = capture_data.get('cdp')
         request_id = capture_data.get('request_id')
 
         if not cdp or not request_id:
             print("No CDP session or request_id available")
-            return ""
+            return b""
 
         print(f"Fetching response body for request: {request_id}")
         result = cdp.send("Network.getResponseBody", {"requestId": request_id})
-        body = result.get('body', '')
+        if result.get('base64Encoded'):
+            body = base64.b64decode(result.get('body', ''))
+        else:
+            body = result.get('body', '').encode('utf-8')
         print(f"✓ Got SSE response body: {len(body)} bytes")
         return body
     except Exception as e:
         print(f"Error getting SSE body: {e}")
-        return ""
-
+        return b""
 
-def wait_for_perplexity_response(page, max_wait=90) -> bool:
-    """Wait for Perplexity to finish generating response."""
-    print("Waiting for Perplexity response to complete...")
-
-    last_content_length = 0
-    stable_count = 0
 
-    for i in range(max_wait):
-        try:
-            # Check page state
-            state = page.evaluate("""
-                () => {
-                    // Check for the stop/generating button (means still generating)
-                    const stopBtn = document.querySelector('button[aria-label*="Stop"], button[aria-label*="stop"]');
-                    const isGenerating = stopBtn && stopBtn.offsetParent !== null;
-
-                    // Check for loading/spinner indicators
-                    const hasSpinner = document.querySelector('[class*="animate-spin"], [class*="loading"], svg[class*="animate"]') !== null;
-
-                    // Look for the answer content in various places
-                    let contentLength = 0;
-                    const contentSelectors = [
-                        '[class*="prose"]',
-                        '[class*="markdown"]',
-                        '[data-testid*="answer"]',
-                        'article',
-                        'main'
-                    ];
-
-                    for (const sel of contentSelectors) {
-                        const el = document.querySelector(sel);
-                        if (el) {
-                            const len = el.innerText.length;
-                            if (len > contentLength) contentLength = len;
-                        }
-                    }
+def wait_for_perplexity_response(page, max_wait=90, capture_data: dict = None) -> bool: #type:ignore
+    """
+    Wait for Perplexity to finish generating response.
 
-                    // Check for "related" section which appears after answer is done
-                    const hasRelated = document.querySelector('[class*="related"], [class*="Related"]') !== null;
+    If `capture_data` from setup_perplexity_cdp_capture is given, the wait ends
+    as soon as the captured SSE stream finishes.
+    """
+    print("Waiting for Perplexity response to complete...")
+    if capture_data and capture_data.get('done'):
+        print("✓ SSE stream already complete")
+        return True
 
-                    // Check for sources/citations
-                    const sourceCount = document.querySelectorAll('[class*="citation"], [class*="source"] a, a[href^="http"]').length;
+    # Poll the completion predicate inside the page rather than evaluating the
+    # state from Python once a second.
+    try:
+        page.evaluate("() => { window.__stableState = null; }")
+        handle = page.wait_for_function(
+            _PERPLEXITY_DONE_JS, timeout=max_wait * 1000, polling=500
+        )
+        state = handle.json_value()
+    except PlaywrightTimeoutError:
+        print(f"⚠️  Response timeout after {max_wait}s - proceeding anyway")
+        return True
+    except Exception as e:
+        if "closed" in str(e).lower():
+            print(f"  Browser closed: {e}")
+            return False
+        print(f"  Error checking state: {e} - proceeding anyway")
+        return True
 
-                    return {
-                        isGenerating: isGenerating || hasSpinner,
-                        contentLength: contentLength,
-                        hasRelated: hasRelated,
-                        sourceCount: sourceCount
-                    };
-                }
-            """)
+    # Extraction waits for related queries to finish rendering
+    if state.get('reason') == 'sse':
+        print(f"✓ Response complete over SSE ({state.get('contentLength', 0)} chars)")
+    elif state.get('reason') == 'related':
+        print(f"✓ Response complete with related section ({state.get('contentLength', 0)} chars)")
+    else:
+        print(f"✓ Response complete ({state.get('contentLength', 0)} chars, {state.get('sourceCount', 0)} sources)")
+    return True
 
-            content_length = state.get('contentLength', 0)
-            is_generating = state.get('isGenerating', False)
-            has_related = state.get('hasRelated', False)
 
-            # Content is stable if it hasn't changed for a few iterations
-            if content_length == last_content_length and content_length > 200:
-                stable_count += 1
-            else:
-                stable_count = 0
-            last_content_length = content_length
-
-            # Done if: not generating, has substantial content, and content is stable
-            if not is_generating and content_length > 500 and stable_count >= 3:
-                print(f"✓ Response complete ({content_length} chars, {state.get('sourceCount', 0)} sources)")
-                time.sleep(3)  # Extra wait for related queries to render
-                return True
-
-            # Also done if we see the related section
-            if has_related and content_length > 300:
-                print(f"✓ Response complete with related section ({content_length} chars)")
-                time.sleep(2)
-                return True
-
-            if i % 5 == 0:
-                status = "generating..." if is_generating else f"loading... (stable: {stable_count})"
-                print(f"  {status} - {content_length} chars ({i}s)")
-
-            time.sleep(1)
-        except Exception as e:
-            if "closed" in str(e).lower():
-                print(f"  Browser closed: {e}")
-                return False
-            if i % 10 == 0:
-                print(f"  Error checking state: {e}")
-            time.sleep(1)
-
-    print(f"⚠️  Response timeout after {max_wait}s - proceeding anyway")
-    return True
+def _json_string_end(body: bytes, start: int) -> int:
+    """Index of the quote closing the JSON string opened just before `start`, or -1."""
+    end = body.find(b'"', start)
+    while end != -1:
+        # The quote is escaped if an odd number of backslashes precede it
+        backslashes = 0
+        while end - 1 - backslashes >= start and body[end - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end
+        end = body.find(b'"', end + 1)
+    return -1
 
 
-def extract_related_queries_from_sse(captured_responses: list) -> list:
+def _scan_related_queries(body: bytes) -> tuple:
     """
-    Extract related_queries from captured SSE responses.
-    Based on perplex_query.py regex extraction.
+    Extract the unique related_queries from a single SSE body, in order, and
+    whether the last `related_queries` array was closed.
+
+    A single forward scan: each `related_queries` array is found with
+    `bytes.find`, then walked string by string up to its closing bracket, so
+    the body is never decoded or backtracked over. The complete strings of an
+    array cut off at the end of the body are still returned.
     """
-    import re
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    queries = []
+    pos = body.find(_RQ_KEY)
+    while pos != -1:
+        pos += len(_RQ_KEY)
+        while body[pos:pos + 1] in (b' ', b'\t', b'\r', b'\n'):
+            pos += 1
+        if pos == len(body):
+            return list(dict.fromkeys(queries)), False
+        if body[pos:pos + 1] != b'[':
+            pos = body.find(_RQ_KEY, pos)
+            continue
+
+        pos += 1
+        while True:
+            quote = body.find(b'"', pos)
+            close = body.find(b']', pos)
+            if quote == -1 and close == -1:
+                # The array is cut off at the end of the body
+                return list(dict.fromkeys(queries)), False
+            if quote == -1 or -1 < close < quote:
+                pos = close + 1
+                break
+
+            end = _json_string_end(body, quote + 1)
+            if end == -1:
+                return list(dict.fromkeys(queries)), False
+            try:
+                query = json.loads(body[quote:end + 1])
+            except ValueError:
+                query = body[quote + 1:end].decode('utf-8', 'replace')
+            query = query.strip()
+            if query:
+                queries.append(query)
+            pos = end + 1
 
-    related_queries = []
+        pos = body.find(_RQ_KEY, pos)
 
-    for response in captured_responses:
-        body = response.get('body', '')
-        # Use the same regex pattern from perplex_query.py
-        matches = re.findall(r'related_queries": \[(.*?)\]', body)
-        if matches:
-            queries = re.findall(r'"([^"]*)"', matches[0])
-            queries = [q for q in queries if q and q.strip() not in [',', ' ']]
-            related_queries.extend(queries)
+    return list(dict.fromkeys(queries)), True
 
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_queries = []
-    for q in related_queries:
-        if q not in seen:
-            seen.add(q)
-            unique_queries.append(q)
 
-    return unique_queries
+def parse_related_queries(body: bytes) -> list:
+    """Extract the unique related_queries from a single SSE body, in order."""
+    return _scan_related_queries(body)[0]
 
 
-def wait_for_response(browser_computer, max_wait=60) -> bool:
-    """Wait for ChatGPT response to complete"""
-    page = browser_computer._page
-    print("Waiting for ChatGPT response...")
+def extract_related_queries_from_sse(captured_responses: list) -> list:
+    """
+    Extract the unique related_queries from captured SSE responses, in order.
 
-    for i in range(max_wait):
-        try:
-            is_responding = page.evaluate("""
-                () => {
-                    // Check if the stop button is visible (means it's generating)
-                    const stopButton = document.querySelector('button[aria-label*="Stop"]');
-                    const isGenerating = stopButton && stopButton.offsetParent !== null;
-
-                    // Check if there's response content
-                    const hasResponse = document.querySelectorAll('[data-message-author-role="assistant"]').length > 0;
-
-                    return {
-                        isGenerating: isGenerating,
-                        hasResponse: hasResponse
-                    };
-                }
-            """)
+    Each body is read with the forward scan in `parse_related_queries`.
+    """
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(
+        q
+        for response in captured_responses
+        for q in parse_related_queries(response.get('body', b''))
+    ))
 
-            if is_responding['hasResponse'] and not is_responding['isGenerating']:
-                print("✓ Response complete")
-                time.sleep(2)  # Extra wait for any final rendering
-                return True
 
-            if i % 5 == 0:
-                status = "generating..." if is_responding.get('isGenerating') else "waiting for response..."
-                print(f"  {status} ({i}s)")
-            time.sleep(1)
-        except Exception as e:
-            if i % 10 == 0:
-                print(f"  Waiting... ({i}s)")
-            time.sleep(1)
+def wait_for_response(page, max_wait=60) -> bool:
+    """Wait for ChatGPT response to complete"""
+    print("Waiting for ChatGPT response...")
 
-    print("⚠️  Response timeout - proceeding anyway")
-    return False
+    # Let Playwright poll the probe inside the page, so the wait costs a single
+    # round-trip instead of one per second.
+    try:
+        page.wait_for_function(_CHATGPT_DONE_JS, timeout=max_wait * 1000, polling=500)
+    except PlaywrightTimeoutError:
+        print("⚠️  Response timeout - proceeding anyway")
+        return False
 
+    # Extraction waits for the final rendering to settle
+    print("✓ Response complete")
+    return True
 
 
-def extract_chatgpt_data(browser_computer, debug=True) -> dict:
+def extract_chatgpt_data(page, debug=False) -> dict:
     try:
-        import time
-
-        page = browser_computer._page
-        time.sleep(2)
+        # Let the final answer finish rendering
+        wait_for_dom_quiet(page)
 
         print("Extracting data from ChatGPT response...")
 
-        # First, run debug extraction to see what's available
+        # One round-trip returns the debug info (if requested) and the extraction.
+        # The debug info is only gathered when it would actually be logged.
+        debug = debug and logger.isEnabledFor(logging.DEBUG)
+        install_page_probes(page)
+        output = page.evaluate("(debug) => window.__extractChatgpt(debug)", debug)
+        debug_result, extraction_result = output['debug'], output['extraction']
         if debug:
-            debug_result = page.evaluate("""
-                () => {
-                    return {
-                        hasSearchIndicator: document.querySelector('[class*="search"]') !== null,
-                        hasSearchedText: document.body.innerText.toLowerCase().includes('searched'),
-                        allClassNames: Array.from(document.querySelectorAll('[class*="search"], [class*="query"], [class*="source"], [data-testid]'))
-                            .slice(0, 20)
-                            .map(el => ({
-                                tag: el.tagName,
-                                className: el.className,
-                                text: el.innerText?.substring(0, 50),
-                                testId: el.getAttribute('data-testid')
-                            })),
-                        citationCount: document.querySelectorAll('sup, [class*="citation"]').length,
-                        linkCount: document.querySelectorAll('a[href^="http"]').length
-                    };
-                }
-            """)
-            print(f"Debug info: {json.dumps(debug_result, indent=2)}")
-
-        extraction_result = page.evaluate(r"""
-            () => {
-                try {
-                    const queries = [];
-                    const sourcesList = [];
-
-                    // Extract the assistant's response text
-                    const assistantMessages = document.querySelectorAll('[data-message-author-role="assistant"]');
-                    let responseText = '';
-
-                    if (assistantMessages.length > 0) {
-                        const lastMessage = assistantMessages[assistantMessages.length - 1];
-                        responseText = lastMessage.innerText || '';
-                    }
-
-                    // Look for the web search UI elements (ChatGPT shows "Searched X sites" when using web search)
-                    // Try multiple possible selectors
-                    const searchSelectors = [
-                        '[class*="SearchStatus"]',
-                        '[class*="search-status"]',
-                        '[aria-label*="search"]',
-                        '[data-testid*="search"]',
-                        'button[aria-label*="Searched"]',
-                        'div:has(> svg) + span:contains("Searched")'
-                    ];
-
-                    searchSelectors.forEach(selector => {
-                        try {
-                            const elements = document.querySelectorAll(selector);
-                            elements.forEach(el => {
-                                const text = el.innerText?.trim() || el.getAttribute('aria-label') || '';
-                                if (text && (text.includes('Searched') || text.includes('sites'))) {
-                                    queries.push(text);
-                                }
-                            });
-                        } catch (e) {
-                            // Selector might not be valid, skip it
-                        }
-                    });
-
-                    // Look for search queries in the full page text
-                    const bodyText = document.body.innerText;
-                    if (bodyText.toLowerCase().includes('searched')) {
-                        // Extract the "Searched X sites" pattern
-                        const searchedMatch = bodyText.match(/Searched\s+\d+\s+sites?/i);
-                        if (searchedMatch) {
-                            queries.push(searchedMatch[0]);
-                        }
-                    }
-
-                    // Try to extract queries from the response content
-                    const queryPatterns = [
-                        /(?:searched for|searching for|I'll search for)[:\s]+["']([^"']+)["']/gi,
-                        /(?:query|queries)[:\s]+["']([^"']+)["']/gi,
-                        /\[Search:\s*([^\]]+)\]/gi
-                    ];
-
-                    queryPatterns.forEach(pattern => {
-                        let match;
-                        while ((match = pattern.exec(responseText)) !== null) {
-                            if (match[1] && match[1].trim().length > 3) {
-                                queries.push(match[1].trim());
-                            }
-                        }
-                    });
-
-                    // Look for citation/source links (these appear when ChatGPT uses web search)
-                    const citations = document.querySelectorAll('sup a, [class*="citation"] a, [data-testid*="citation"]');
-                    citations.forEach(citation => {
-                        const url = citation.href || citation.getAttribute('href');
-                        const text = citation.getAttribute('title') || citation.innerText || '';
-                        if (url && url.startsWith('http') && !url.includes('chatgpt.com')) {
-                            sourcesList.push({
-                                title: text.substring(0, 100) || 'Source',
-                                url: url
-                            });
-                        }
-                    });
-
-                    // Look for all external links in the response
-                    const links = document.querySelectorAll('a[href^="http"]');
-                    const seenUrls = new Set(sourcesList.map(s => s.url));
-                    links.forEach(link => {
-                        const url = link.href;
-                        const title = link.innerText?.trim() || link.getAttribute('aria-label') || url;
-
-                        if (url && !seenUrls.has(url)) {
-                            // Filter out ChatGPT's own links
-                            if (!url.includes('chatgpt.com') && !url.includes('openai.com')) {
-                                sourcesList.push({
-                                    title: title.substring(0, 100),
-                                    url: url
-                                });
-                                seenUrls.add(url);
-                            }
-                        }
-                    });
-
-                    return {
-                        queries: [...new Set(queries)].slice(0, 10),
-                        response: responseText.substring(0, 2000),
-                        sources: sourcesList.slice(0, 10),
-                        error: null
-                    };
-                } catch (error) {
-                    console.error("Extraction error:", error);
-                    return {
-                        error: error.toString(),
-                        queries: [],
-                        response: '',
-                        sources: []
-                    };
-                }
-            }
-        """)
+            logger.debug("Debug info: %s", debug_result)
 
         print(f"Extracted {len(extraction_result.get('queries', []))} queries, {len(extraction_result.get('sources', []))} sources")
         return extraction_result
@@ -571,90 +990,15 @@ def extract_chatgpt_data(browser_computer, debug=True) -> dict:
         return {"queries": [], "response": "", "sources": [], "error": str(e)}
 
 
-def extract_perplexity_data(browser_computer) -> dict:
+def extract_perplexity_data(page) -> dict:
     """Extract structured data from Perplexity including related queries"""
     try:
-        page = browser_computer._page
-        time.sleep(2)
+        # Let the answer and related queries finish rendering
+        wait_for_dom_quiet(page)
 
         # Extract the main answer, sources, and related queries
-        result = page.evaluate("""
-            () => {
-                // Extract main answer content
-                const answerSelectors = [
-                    '[class*="prose"]',
-                    '[class*="Answer"]',
-                    '[class*="response"]',
-                    'article',
-                    'main [class*="markdown"]'
-                ];
-
-                let answer = "";
-                for (const sel of answerSelectors) {
-                    const el = document.querySelector(sel);
-                    if (el && el.innerText.length > 50) {
-                        answer = el.innerText;
-                        break;
-                    }
-                }
-
-                // Extract sources/citations
-                const sources = Array.from(document.querySelectorAll('a[href^="http"]'))
-                    .filter(a => {
-                        const href = a.href;
-                        return href &&
-                               !href.includes('perplexity.ai') &&
-                               !href.includes('google.com') &&
-                               a.textContent.trim().length > 0;
-                    })
-                    .slice(0, 15)
-                    .map(a => ({ url: a.href, title: a.textContent.trim().substring(0, 100) }));
-
-                // Extract related queries - Perplexity shows these at the bottom
-                const relatedQueries = [];
-
-                // Try multiple selectors for related queries
-                const relatedSelectors = [
-                    '[class*="related"] button',
-                    '[class*="Related"] button',
-                    '[class*="suggestion"]',
-                    '[class*="Suggestion"]',
-                    'button[class*="query"]',
-                    // Related questions are often in a section at the bottom
-                    '[class*="follow-up"]',
-                    '[class*="FollowUp"]'
-                ];
-
-                for (const sel of relatedSelectors) {
-                    const elements = document.querySelectorAll(sel);
-                    elements.forEach(el => {
-                        const text = el.innerText?.trim();
-                        if (text && text.length > 10 && text.length < 200) {
-                            relatedQueries.push(text);
-                        }
-                    });
-                }
-
-                // Also look for any buttons/links that look like questions
-                document.querySelectorAll('button, [role="button"]').forEach(btn => {
-                    const text = btn.innerText?.trim();
-                    if (text && text.includes('?') && text.length > 15 && text.length < 150) {
-                        if (!relatedQueries.includes(text)) {
-                            relatedQueries.push(text);
-                        }
-                    }
-                });
-
-                // Remove duplicates
-                const uniqueRelated = [...new Set(relatedQueries)];
-
-                return {
-                    answer: answer.substring(0, 3000),
-                    sources,
-                    relatedQueries: uniqueRelated.slice(0, 10)
-                };
-            }
-        """)
+        install_page_probes(page)
+        result = page.evaluate("() => window.__extractPplx()")
 
         print(f"Extracted from DOM: {len(result.get('answer', ''))} chars answer, {len(result.get('sources', []))} sources, {len(result.get('relatedQueries', []))} related queries")
         return result
@@ -663,13 +1007,105 @@ def extract_perplexity_data(browser_computer) -> dict:
         return {"answer": "", "sources": [], "relatedQueries": [], "error": str(e)}
 
 
-def query_service(service_name: str, query: str) -> dict:
+def run_chatgpt_query(page, query: str) -> dict:
+    """Submit a query to ChatGPT, wait for the answer and extract it."""
+    if not submit_chatgpt_query(page, query):
+        raise Exception("Failed to submit query to chatgpt")
+
+    try:
+        wait_for_response(page, max_wait=120)
+    except Exception as e:
+        if "Target page, context or browser has been closed" in str(e):
+            print("⚠️  Browser closed while waiting for response")
+            raise Exception("Browser session expired while waiting for ChatGPT response.") from e
+        raise
+
+    return extract_chatgpt_data(page)
+
+
+def run_perplexity_query(page, query: str) -> dict:
+    """Submit a query to Perplexity, wait for the answer and extract it."""
+    # Set up CDP capture before submitting, so the SSE response is seen
+    cdp_capture = setup_perplexity_cdp_capture(page)
+
+    if not submit_perplexity_query(page, query, []):
+        raise Exception("Failed to submit query to perplexity")
+
+    # Wait for Perplexity response with proper detection
+    wait_for_perplexity_response(page, max_wait=60, capture_data=cdp_capture)
+
+    # Try to get related queries from CDP-captured SSE response
+    related_queries_from_sse = cdp_capture.get('related_queries', [])
+    if not related_queries_from_sse and cdp_capture.get('request_id'):
+        sse_body = get_perplexity_sse_body(cdp_capture)
+        if sse_body:
+            related_queries_from_sse = parse_related_queries(sse_body)
+    if related_queries_from_sse:
+        print(f"Extracted {len(related_queries_from_sse)} related queries from SSE")
+
+    # Also extract from DOM as fallback/additional data
+    extracted_data = extract_perplexity_data(page)
+
+    # Use SSE-captured queries if available, otherwise use DOM
+    if related_queries_from_sse:
+        extracted_data['relatedQueries'] = related_queries_from_sse
+        print(f"Related queries from SSE: {related_queries_from_sse}")
+
+    return extracted_data
+
+
+# How each service in SERVICES is driven once its page has loaded.
+SERVICE_RUNNERS = {
+    "chatgpt": run_chatgpt_query,
+    "perplexity": run_perplexity_query,
+}
+
+
+def _run_service_on_page(service_name: str, query: str, page) -> dict:
+    """Run the service's runner on a page that has navigated to it."""
+    print("Waiting for page to load...")
+    # Both services keep streaming connections open and never reach
+    # networkidle; the page is ready once its input box is visible.
+    page.wait_for_load_state('domcontentloaded')
+    try:
+        page.wait_for_selector(
+            f"{SERVICES[service_name]['input_selector']} >> visible=true", timeout=15000
+        )
+    except PlaywrightTimeoutError:
+        pass  # The submit helpers wait out challenges and report a missing input
+
+    install_page_probes(page)
+
+    # Submit the query, wait for the answer and extract it
+    extracted_data = SERVICE_RUNNERS[service_name](page, query)
+
+    return {
+        "service": service_name,
+        "service_name": SERVICES[service_name]['name'],
+        "query": query,
+        "method": "playwright",  # Indicate we used Playwright
+        "extracted_data": extracted_data,
+        "timestamp": datetime.now().isoformat(),
+        "success": True
+    }
+
+
+def query_service(
+    service_name: str,
+    query: str,
+    shared_session: _SharedBrowserbaseSession = None, #type:ignore
+    page=None,
+) -> dict:
     """
     Query a single service using Playwright with Browserbase (no login required).
 
     Args:
         service_name: Name of the service to query
         query: The query to execute
+        shared_session: Optional session to open a browser context in, instead
+            of creating a dedicated Browserbase session
+        page: Optional existing Playwright page to run the query in; it is
+            navigated to the service and no browser is opened
 
     Returns:
         Dictionary containing the service name, query, and extracted results
@@ -684,90 +1120,30 @@ def query_service(service_name: str, query: str) -> dict:
 
     service_info = SERVICES[service_name]
 
-    print(f"\n{'='*60}")
+    print(f"\n{_BANNER}")
     print(f"Querying {service_info['name']} (using Playwright)...")
     print(f"Query: {query}")
-    print(f"{'='*60}\n")
+    print(f"{_BANNER}\n")
 
     try:
-        # Create computer environment with Browserbase
-        env = BrowserbaseComputer(
-            screen_size=SCREEN_SIZE,
-            initial_url=service_info['url'],
-        )
-
-        with env as browser_computer:
-            page = browser_computer._page
-            print("Waiting for page to load...")
-            time.sleep(5)  # Give page time to load initially
-
-            # Set up CDP capture for Perplexity (before submitting query)
-            cdp_capture = None
-            if service_name == "perplexity":
-                cdp_capture = setup_perplexity_cdp_capture(page)
-
-            # Submit query using Playwright
-            submit_success = False
-            if service_name == "chatgpt":
-                submit_success = submit_chatgpt_query(page, query)
-            elif service_name == "perplexity":
-                submit_success = submit_perplexity_query(page, query, [])
-
-            if not submit_success:
-                raise Exception(f"Failed to submit query to {service_name}")
+        if page is not None:
+            page.goto(service_info['url'], wait_until='domcontentloaded')
+            result = _run_service_on_page(service_name, query, page)
+        else:
+            # Create computer environment with Browserbase
+            env = BrowserbaseComputer(
+                screen_size=SCREEN_SIZE,
+                initial_url=service_info['url'],
+                connect_url=shared_session.connect_url if shared_session else None,
+            )
 
-            # Wait for response to complete
-            if service_name == "chatgpt":
-                try:
-                    wait_for_response(browser_computer, max_wait=120)
-                except Exception as e:
-                    if "Target page, context or browser has been closed" in str(e):
-                        print("⚠️  Browser closed while waiting for response")
-                        raise Exception("Browser session expired while waiting for ChatGPT response.") from e
-                    raise
-            elif service_name == "perplexity":
-                # Wait for Perplexity response with proper detection
-                wait_for_perplexity_response(page, max_wait=60)
-
-            # Extract structured data based on service
-            extracted_data = {}
-            if service_name == "chatgpt":
-                extracted_data = extract_chatgpt_data(browser_computer)
-            elif service_name == "perplexity":
-                # Try to get related queries from CDP-captured SSE response
-                related_queries_from_sse = []
-                if cdp_capture and cdp_capture.get('request_id'):
-                    sse_body = get_perplexity_sse_body(cdp_capture)
-                    if sse_body:
-                        # Parse related_queries from SSE body
-                        import re
-                        matches = re.findall(r'related_queries": \[(.*?)\]', sse_body)
-                        if matches:
-                            queries = re.findall(r'"([^"]*)"', matches[0])
-                            related_queries_from_sse = [q for q in queries if q and q.strip() not in [',', ' ']]
-                            print(f"Extracted {len(related_queries_from_sse)} related queries from SSE")
-
-                # Also extract from DOM as fallback/additional data
-                extracted_data = extract_perplexity_data(browser_computer)
-
-                # Use SSE-captured queries if available, otherwise use DOM
-                if related_queries_from_sse:
-                    extracted_data['relatedQueries'] = related_queries_from_sse
-                    print(f"Related queries from SSE: {related_queries_from_sse}")
-
-            result = {
-                "service": service_name,
-                "service_name": service_info['name'],
-                "query": query,
-                "method": "playwright",  # Indicate we used Playwright
-                "extracted_data": extracted_data,
-                "timestamp": datetime.now().isoformat(),
-                "success": True
-            }
+            with env as browser_computer:
+                result = _run_service_on_page(service_name, query, browser_computer._page)
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        # The error is reported in the result; the full trace is only
+        # formatted when DEBUG logging is enabled.
+        logger.debug("query_service failed for %s", service_name, exc_info=True)
         result = {
             "service": service_name,
             "service_name": service_info['name'],
@@ -780,71 +1156,547 @@ def query_service(service_name: str, query: str) -> dict:
     return result
 
 
-def fanout_query(query: str, services: list = None, output_file: str = None) -> list: #type:ignore
+def _cache_path(service: str, query: str, cache_dir: str = CACHE_DIR) -> str:
+    key = hashlib.sha256(query.lower().strip().encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{service}_{key}.json")
+
+
+def load_cached_result(service: str, query: str, ttl: float, cache_dir: str = CACHE_DIR):
+    """
+    Return the cached result for (service, query) if it is newer than `ttl`
+    seconds. A negative `ttl` accepts cached results of any age.
+    """
+    path = _cache_path(service, query, cache_dir)
+    try:
+        if ttl >= 0 and time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, 'rb') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_result(service: str, query: str, result: dict, cache_dir: str = CACHE_DIR):
+    """Cache a successful result for later runs of the same query."""
+    if not result.get('success'):
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file and move it into place, so a concurrent
+        # reader never sees a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_dumps(result))
+            os.replace(tmp_path, _cache_path(service, query, cache_dir))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Could not cache {service} result: {e}")
+
+
+def _failure_result(service: str, query: str, error: str) -> dict:
+    return {
+        "service": service,
+        "service_name": SERVICES.get(service, {}).get('name', service),
+        "query": query,
+        "error": error,
+        "timestamp": datetime.now().isoformat(),
+        "success": False
+    }
+
+
+def _is_transient(error: str) -> bool:
+    """Whether a query_service error looks like a dropped connection worth retrying."""
+    return any(marker in error for marker in _TRANSIENT_ERROR_MARKERS)
+
+
+def _query_service_in_worker(
+    service: str,
+    query: str,
+    shared_session: _SharedBrowserbaseSession,
+    cache_ttl: float = 0,
+    cache_dir: str = CACHE_DIR,
+) -> dict:
+    """
+    Run `query_service` on an executor thread.
+
+    A failure caused by a transient network error is retried, up to
+    MAX_ATTEMPTS attempts in total, with exponential backoff.
+
+    With a non-zero `cache_ttl`, a result cached in `cache_dir` within that many
+    seconds (or at any time, if negative) is returned instead, without opening
+    a browser context at all.
+    """
+    if cache_ttl:
+        cached = load_cached_result(service, query, cache_ttl, cache_dir)
+        if cached is not None:
+            print(f"Using cached result for {service}")
+            cached['cached'] = True
+            return cached
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        result = query_service(service, query, shared_session)
+        if result.get('success') or attempt == MAX_ATTEMPTS or not _is_transient(result.get('error', '')):
+            break
+        delay = RETRY_BACKOFF_S * 2 ** (attempt - 1)
+        print(f"Transient error from {service}, retrying in {delay:.0f}s: {result.get('error')}")
+        time.sleep(delay)
+
+    if cache_ttl:
+        save_cached_result(service, query, result, cache_dir)
+    return result
+
+
+def _resolve(future: asyncio.Future, result=None, error: BaseException = None): #type:ignore
+    """Complete `future` unless `wait_for` already gave up on it."""
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+
+def _run_pairs_in_worker(
+    jobs: queue.Queue,
+    loop: asyncio.AbstractEventLoop,
+    shared_session: _SharedBrowserbaseSession,
+    cache_ttl: float = 0,
+    cache_dir: str = CACHE_DIR,
+):
+    """
+    Run queued (service, query, future) jobs on one executor thread until a
+    None job arrives, then stop the thread's Playwright driver.
+
+    The driver is kept across jobs, so each worker starts one Node process per
+    fanout instead of one per pair. It can only be stopped from this thread.
+    """
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            service, query, future = job
+            if future.done():
+                continue  # Timed out while every worker was busy
+            try:
+                result = _query_service_in_worker(service, query, shared_session, cache_ttl, cache_dir)
+            except Exception as e:
+                outcome = (None, e)
+            else:
+                outcome = (result, None)
+            try:
+                loop.call_soon_threadsafe(_resolve, future, *outcome)
+            except RuntimeError:
+                pass  # The fanout finished while this pair was timing out
+    finally:
+        stop_playwright()
+
+
+async def _query_services_concurrently(
+    pairs: list,
+    max_concurrency: int,
+    shared_session: _SharedBrowserbaseSession,
+    cache_ttl: float = 0,
+    on_result=None,
+    cache_dir: str = CACHE_DIR,
+    per_service_timeout: float = None, #type:ignore
+) -> list:
+    """
+    Run `query_service` for every (service, query) pair concurrently.
+
+    Sync Playwright objects are bound to the thread that created them, so
+    pairs run on up to `max_concurrency` worker threads, each keeping its own
+    Playwright driver for the whole fanout and opening a browser context in
+    `shared_session` per pair.
+
+    A pair still running after `per_service_timeout` seconds is recorded as
+    failed. Its worker cannot be interrupted, so a replacement worker takes
+    over the remaining pairs; the stuck one is left to wind down when the
+    shared session is released, and stops its driver after that.
+
+    Results are passed to `on_result` as soon as their pair finishes. The
+    returned list is still in the order of `pairs`.
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max_concurrency)
+
+    jobs = queue.Queue()
+    num_workers = 0
+    # Room for the initial workers plus one replacement per pair that times out
+    executor = ThreadPoolExecutor(max_workers=max(min(max_concurrency, len(pairs)) + len(pairs), 1))
+
+    def _start_worker():
+        nonlocal num_workers
+        num_workers += 1
+        loop.run_in_executor(
+            executor, _run_pairs_in_worker, jobs, loop, shared_session, cache_ttl, cache_dir,
+        )
+
+    for _ in range(min(max_concurrency, len(pairs))):
+        _start_worker()
+    try:
+        async def _run(service: str, query: str) -> dict:
+            async with sem:
+                future = loop.create_future()
+                jobs.put((service, query, future))
+                try:
+                    result = await asyncio.wait_for(future, timeout=per_service_timeout)
+                except asyncio.TimeoutError:
+                    # The worker is still busy with this pair, so the pairs
+                    # queued behind it would otherwise time out unrun.
+                    _start_worker()
+                    result = _failure_result(service, query, f"Timed out after {per_service_timeout}s")
+                except Exception as e:
+                    # query_service reports its own failures, but keep one
+                    # crashed worker from discarding the results of the others.
+                    result = _failure_result(service, query, str(e))
+            return result
+
+        tasks = [asyncio.create_task(_run(service, query)) for service, query in pairs]
+
+        # Handled on the event loop thread, so writes never interleave.
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            if on_result is not None:
+                on_result(result)
+
+        return [task.result() for task in tasks]
+    finally:
+        # Each worker stops its driver once it reaches its None job. Don't
+        # block on workers still busy with a pair that timed out.
+        for _ in range(num_workers):
+            jobs.put(None)
+        executor.shutdown(wait=False)
+
+
+def query_services(
+    pairs,
+    max_concurrency: int = None, #type:ignore
+    output_file: str = None, #type:ignore
+    cache_ttl: float = 0,
+    cache_dir: str = CACHE_DIR,
+    per_service_timeout: float = None, #type:ignore
+    full_payload: bool = False,
+    on_result=None,
+) -> list:
+    """
+    Query several (service, query) pairs concurrently in one Browserbase session.
+
+    Args:
+        pairs: List of (service name, query) tuples, or a dict mapping each
+            service name to its query; each pair gets its own browser context
+        max_concurrency: Maximum number of pairs queried at once (default: all of them)
+        output_file: Optional file to stream results to; see `_ResultWriter`
+        cache_ttl: Reuse results cached within this many seconds (0 disables the
+            cache, a negative value never expires cached results)
+        cache_dir: Directory the cached results are kept in
+        per_service_timeout: Seconds after which a pair is given up on (default: no limit)
+        full_payload: Save results untrimmed instead of dropping large fields
+        on_result: Optional callable passed each result as soon as it arrives
+
+    Returns:
+        List of results, in the same order as `pairs`
+    """
+    if isinstance(pairs, dict):
+        pairs = list(pairs.items())
+    if max_concurrency is None:
+        max_concurrency = len(pairs)
+
+    with _ResultWriter(output_file, full_payload) if output_file else contextlib.nullcontext() as writer:
+        def _on_result(result: dict):
+            if writer is not None:
+                writer.write(result)
+            if on_result is not None:
+                on_result(result)
+
+        with _SharedBrowserbaseSession(SCREEN_SIZE) as shared_session:
+            return asyncio.run(
+                _query_services_concurrently(
+                    pairs, max(1, max_concurrency), shared_session, cache_ttl,
+                    on_result=_on_result,
+                    cache_dir=cache_dir,
+                    per_service_timeout=per_service_timeout,
+                )
+            )
+
+
+# Fields dropped from a result's extracted data once it has been summarized,
+# and left out of the saved output unless the full payload is requested.
+_LARGE_FIELDS = ('raw_html', 'screenshot', 'cookies')
+
+# Extracted strings longer than this many characters are truncated in the
+# saved output.
+MAX_FIELD_CHARS = 64_000
+
+
+def _dumps(obj, indent: bool = False, newline: bool = False) -> bytes:
+    """
+    Serialize `obj` to UTF-8 JSON, with orjson when it is installed, optionally
+    followed by a newline.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        if newline:
+            option |= orjson.OPT_APPEND_NEWLINE
+        return orjson.dumps(obj, option=option)
+    if indent:
+        data = json.dumps(obj, indent=2, ensure_ascii=False)
+    else:
+        data = json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+    return (data + "\n" if newline else data).encode('utf-8')
+
+
+def _slim(result: dict, max_field_chars: int = MAX_FIELD_CHARS) -> dict:
+    """
+    Return a copy of `result` without its large extracted fields, and with any
+    other extracted string longer than `max_field_chars` characters truncated.
+    """
+    extracted = result.get('extracted_data')
+    if not extracted:
+        return result
+
+    slim_extracted = {}
+    for key, value in extracted.items():
+        if key in _LARGE_FIELDS:
+            continue
+        if isinstance(value, str) and len(value) > max_field_chars:
+            value = value[:max_field_chars] + "...<truncated>"
+        slim_extracted[key] = value
+    return {**result, 'extracted_data': slim_extracted}
+
+
+class _ResultWriter:
+    """
+    Streams fanout results to a file as they arrive.
+
+    `.ndjson` and `.jsonl` files get one JSON object per line; any other file
+    gets a JSON array, framed by hand so each result is written as soon as it is
+    ready and the array is closed even if the run is interrupted. Results are
+    passed through `_slim` unless `full_payload` is set, and each one goes out
+    as a single binary write, framing included.
+    """
+
+    def __init__(self, path: str, full_payload: bool = False):
+        self._path = path
+        self._lines = path.endswith(('.ndjson', '.jsonl'))
+        self._full_payload = full_payload
+        self._file = None
+        self._count = 0
+
+    def __enter__(self):
+        self._file = open(self._path, 'wb')
+        return self
+
+    def write(self, result: dict):
+        if not self._full_payload:
+            result = _slim(result)
+        if self._lines:
+            self._file.write(_dumps(result, newline=True))
+        else:
+            self._file.write(b"".join((b",\n" if self._count else b"[\n", _dumps(result, indent=True))))
+        self._count += 1
+        self._file.flush()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self._lines:
+            self._file.write(b"\n]\n" if self._count else b"[]\n")
+        self._file.close()
+
+
+# Every source the extractors return has a title.
+_title = operator.itemgetter('title')
+
+
+def _summarize_chatgpt(extracted: dict) -> list:
+    queries = extracted.get('queries', [])
+    response = extracted.get('response', '')
+    sources = extracted.get('sources', [])
+    preview = response if len(response) <= 300 else response[:300] + "..."
+    return [
+        f"Extracted Queries ({len(queries)}): {queries}",
+        f"Response Preview: {preview}",
+        f"Extracted Sources ({len(sources)}): {list(map(_title, sources[:5]))}",
+    ]
+
+
+def _summarize_perplexity(extracted: dict) -> list:
+    answer = extracted.get('answer', '')
+    sources = extracted.get('sources', [])
+    related = extracted.get('relatedQueries', [])
+    preview = answer if len(answer) <= 200 else answer[:200] + "..."
+    return [
+        f"Answer Preview: {preview}",
+        f"Sources ({len(sources)}): {list(map(_title, sources[:3]))}",
+        f"Related Queries ({len(related)}): {related}",
+    ]
+
+
+def _summarize_default(extracted: dict) -> list:
+    return []
+
+
+# The summary lines printed for each service's extracted data.
+SUMMARY_PRINTERS = {
+    "chatgpt": _summarize_chatgpt,
+    "perplexity": _summarize_perplexity,
+}
+
+
+class FanoutReport(pydantic.BaseModel):
+    # Results from every service, in the order the services were given.
+    results: list = []
+    successful: int = 0
+    failed: int = 0
+    # Results served from the disk cache instead of a browser.
+    cache_hits: int = 0
+    # Wall time of the whole fanout.
+    duration_s: float = 0.0
+
+
+def _print_result(service: str, result: dict):
+    """Print the summary of one service's result."""
+    # Built up and written at once, so each summary is a single write
+    buf = [f"\n{_BANNER}", f"Result from {result.get('service_name', service)}:"]
+    if result.get('success'):
+        buf.append(f"✓ Success (method: {result.get('method', 'unknown')})")
+
+        # Print extracted data based on service
+        extracted = result.get('extracted_data', {})
+        buf.extend(SUMMARY_PRINTERS.get(service, _summarize_default)(extracted))
+
+        if extracted.get('error'):
+            buf.append(f"\nExtraction Warning: {extracted.get('error')}")
+    else:
+        buf.append("✗ Failed")
+        buf.append(f"Error: {result.get('error', 'Unknown error')}")
+    buf.append(f"{_BANNER}\n")
+
+    sys.stdout.write("\n".join(buf) + "\n")
+    sys.stdout.flush()
+
+
+async def fanout_query_async(
+    query: str,
+    services: list = None, #type:ignore
+    output_file: str = None, #type:ignore
+    max_concurrency: int = None, #type:ignore
+    cache_ttl: float = 0,
+    full_payload: bool = False,
+    cache_dir: str = CACHE_DIR,
+    per_service_timeout: float = None, #type:ignore
+    quiet: bool = False,
+) -> FanoutReport:
     """
     Execute a query across multiple services (fanout pattern).
 
+    Every service is queried concurrently, and each result is summarized as
+    soon as it arrives rather than after the slowest service has finished.
+
     Args:
         query: The query to execute
         services: List of service names to query (default: all services)
-        output_file: Optional file to save results to
+        output_file: Optional file to stream results to; see `_ResultWriter`
+        max_concurrency: Maximum number of services queried at once (default: all of them)
+        cache_ttl: Reuse results cached within this many seconds (0 disables the
+            cache, a negative value never expires cached results)
+        full_payload: Save results untrimmed instead of dropping large fields
+        cache_dir: Directory the cached results are kept in
+        per_service_timeout: Seconds after which a service is given up on (default: no limit)
+        quiet: Print nothing while querying, not even the per-service summaries
 
     Returns:
-        List of results from all services
+        A FanoutReport with the results from all services, in the order of
+        `services`, and the counts gathered as they arrived
     """
     if services is None:
         services = list(SERVICES.keys())
-
-    results = []
-
-    print(f"\n{'='*60}")
-    print(f"QUERY FANOUT")
-    print(f"Query: {query}")
-    print(f"Services: {', '.join(services)}")
-    print(f"{'='*60}\n")
-
-    # Query each service sequentially
-    for service in services:
-        result = query_service(service, query)
-        results.append(result)
-
-        # Print result summary
-        print(f"\n{'='*60}")
-        print(f"Result from {result.get('service_name', service)}:")
-        if result.get('success'):
-            print(f"✓ Success (method: {result.get('method', 'unknown')})")
-
-            # Print extracted data based on service
-            extracted = result.get('extracted_data', {})
-            if service == 'chatgpt':
-                queries = extracted.get('queries', [])
-                response = extracted.get('response', '')
-                sources = extracted.get('sources', [])
-                print(f"Extracted Queries ({len(queries)}): {queries}")
-                print(f"Response Preview: {response[:300]}..." if len(response) > 300 else f"Response: {response}")
-                print(f"Extracted Sources ({len(sources)}): {[s.get('title') for s in sources[:5]]}")
-            elif service == 'perplexity':
-                answer = extracted.get('answer', '')
-                sources = extracted.get('sources', [])
-                related = extracted.get('relatedQueries', [])
-                print(f"Answer Preview: {answer[:200]}...")
-                print(f"Sources ({len(sources)}): {[s.get('title') for s in sources[:3]]}")
-                print(f"Related Queries ({len(related)}): {related}")
-
-            if extracted.get('error'):
-                print(f"\nExtraction Warning: {extracted.get('error')}")
-        else:
-            print(f"✗ Failed")
-            print(f"Error: {result.get('error', 'Unknown error')}")
-        print(f"{'='*60}\n")
-
-    # Save results to file if requested
+    if max_concurrency is None:
+        max_concurrency = len(services)
+    # Clamped before the banner, so it shows the limit actually used
+    max_concurrency = max(1, max_concurrency)
+
+    report = FanoutReport()
+    start = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            # Drop everything printed while querying, including the progress
+            # output of the worker threads
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+        print(f"\n{_BANNER}")
+        print("QUERY FANOUT")
+        print(f"Query: {query}")
+        print(f"Services: {', '.join(services)}")
+        print(f"Max concurrency: {max_concurrency}")
+        print(f"{_BANNER}\n")
+
+        # Query all services in one shared browser session. Results are saved
+        # as they arrive, so a late failure (or Ctrl-C) does not lose earlier
+        # ones.
+        with _ResultWriter(output_file, full_payload) if output_file else contextlib.nullcontext() as writer:
+            def _on_result(result: dict):
+                if result.get('success'):
+                    report.successful += 1
+                else:
+                    report.failed += 1
+                if result.get('cached'):
+                    report.cache_hits += 1
+                if writer is not None:
+                    writer.write(result)
+                if not quiet:
+                    _print_result(result.get('service'), result)
+                # Once saved and summarized, large payloads are not needed again
+                extracted = result.get('extracted_data') or {}
+                for field in _LARGE_FIELDS:
+                    extracted.pop(field, None)
+
+            with _SharedBrowserbaseSession(SCREEN_SIZE) as shared_session:
+                report.results = await _query_services_concurrently(
+                    [(service, query) for service in services],
+                    max_concurrency,
+                    shared_session,
+                    cache_ttl=cache_ttl,
+                    on_result=_on_result,
+                    cache_dir=cache_dir,
+                    per_service_timeout=per_service_timeout,
+                )
+
+    report.duration_s = time.perf_counter() - start
     if output_file:
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2)
         print(f"\nResults saved to: {output_file}")
 
-    return results
+    return report
+
+
+def fanout_query(
+    query: str,
+    services: list = None, #type:ignore
+    output_file: str = None, #type:ignore
+    max_concurrency: int = None, #type:ignore
+    cache_ttl: float = 0,
+    full_payload: bool = False,
+    cache_dir: str = CACHE_DIR,
+    per_service_timeout: float = None, #type:ignore
+    quiet: bool = False,
+) -> FanoutReport:
+    """Synchronous wrapper around `fanout_query_async`; see it for the arguments."""
+    return asyncio.run(
+        fanout_query_async(
+            query,
+            services=services,
+            output_file=output_file,
+            max_concurrency=max_concurrency,
+            cache_ttl=cache_ttl,
+            full_payload=full_payload,
+            cache_dir=cache_dir,
+            per_service_timeout=per_service_timeout,
+            quiet=quiet,
+        )
+    )
 
 
 def main() -> int:
@@ -869,27 +1721,90 @@ def main() -> int:
         "--output",
         type=str,
         default=None,
-        help="Output file to save results (JSON format).",
+        help="Output file to save results (.ndjson/.jsonl for one result per line, otherwise a JSON array).",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=5,
+        help="Maximum number of services queried at once (default: 5).",
+    )
+    parser.add_argument(
+        "--per-service-timeout",
+        type=float,
+        default=None,
+        help="Give up on a service after this many seconds (default: no limit).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        "--cache-ttl-seconds",
+        dest="cache_ttl",
+        type=float,
+        default=0,
+        help="Reuse results cached within this many seconds; negative never expires (default: 0, no caching).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=CACHE_DIR,
+        help=f"Directory to keep cached results in (default: {CACHE_DIR}).",
+    )
+
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only print the final summary, not the per-service progress and results.",
+    )
+    parser.add_argument(
+        "--full-payload",
+        action="store_true",
+        help="Save results untrimmed (by default large fields are dropped or truncated).",
     )
 
     args = parser.parse_args()
 
+    if args.max_concurrency < 1:
+        parser.error("--max-concurrency must be at least 1")
+    if args.per_service_timeout is not None and args.per_service_timeout <= 0:
+        parser.error("--per-service-timeout must be positive")
+
+    if args.services:
+        # Each service is an expensive browser run, so never query one twice
+        services = list(dict.fromkeys(args.services))
+        if len(services) < len(args.services):
+            duplicates = [service for service in services if args.services.count(service) > 1]
+            logger.warning("Ignoring duplicate services in --services: %s", ' '.join(duplicates))
+        # argparse choices already enforce this; checked again in case the
+        # choices and SERVICES ever drift apart
+        unknown = [service for service in services if service not in SERVICES]
+        if unknown:
+            parser.error(f"unknown services: {', '.join(unknown)}")
+        args.services = services
+
     # Run fanout query
-    results = fanout_query(
+    report = fanout_query(
         query=args.query,
         services=args.services,
-        output_file=args.output
+        output_file=args.output,
+        max_concurrency=args.max_concurrency,
+        cache_ttl=args.cache_ttl,
+        full_payload=args.full_payload,
+        cache_dir=args.cache_dir,
+        per_service_timeout=args.per_service_timeout,
+        quiet=args.quiet,
     )
 
     # Print summary
-    print(f"\n{'='*60}")
+    print(f"\n{_BANNER}")
     print("SUMMARY")
-    print(f"{'='*60}")
-    print(f"Total services queried: {len(results)}")
-    successful = sum(1 for r in results if r.get('success'))
-    print(f"Successful queries: {successful}")
-    print(f"Failed queries: {len(results) - successful}")
-    print(f"{'='*60}\n")
+    print(_BANNER)
+    print(f"Total services queried: {len(report.results)}")
+    print(f"Successful queries: {report.successful}")
+    print(f"Failed queries: {report.failed}")
+    if args.cache_ttl:
+        print(f"Cache hits: {report.cache_hits} / {len(report.results)}")
+    print(f"Duration: {report.duration_s:.1f}s")
+    print(f"{_BANNER}\n")
 
     return 0
 
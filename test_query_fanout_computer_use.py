@@ -0,0 +1,366 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import query_fanout_computer_use as fanout
+
+
+class TestResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.results = [
+            {"service": "chatgpt", "success": True, "extracted_data": {"response": "héllo"}},
+            {"service": "perplexity", "success": False, "error": "boom"},
+        ]
+
+    def _path(self, name):
+        return os.path.join(self._tmp.name, name)
+
+    def test_json_array_round_trip(self):
+        path = self._path('results.json')
+        with fanout._ResultWriter(path) as writer:
+            for result in self.results:
+                writer.write(result)
+
+        with open(path) as f:
+            self.assertEqual(json.load(f), self.results)
+
+    def test_ndjson_round_trip(self):
+        path = self._path('results.ndjson')
+        with fanout._ResultWriter(path) as writer:
+            for result in self.results:
+                writer.write(result)
+
+        with open(path) as f:
+            self.assertEqual([json.loads(line) for line in f], self.results)
+
+    def test_slims_unless_full_payload(self):
+        result = {"service": "chatgpt", "extracted_data": {"response": "x", "raw_html": "<html>"}}
+        slim_path = self._path('slim.ndjson')
+        full_path = self._path('full.ndjson')
+        with fanout._ResultWriter(slim_path) as writer:
+            writer.write(result)
+        with fanout._ResultWriter(full_path, full_payload=True) as writer:
+            writer.write(result)
+
+        with open(slim_path) as f:
+            self.assertEqual(json.load(f)['extracted_data'], {"response": "x"})
+        with open(full_path) as f:
+            self.assertEqual(json.load(f), result)
+
+    def _write_bytes(self, name, results):
+        path = self._path(name)
+        with fanout._ResultWriter(path) as writer:
+            for result in results:
+                writer.write(result)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _assert_exact_bytes(self):
+        self.assertEqual(
+            self._write_bytes('a.json', [{"a": "é"}, {"b": [1]}]),
+            '[\n{\n  "a": "é"\n},\n{\n  "b": [\n    1\n  ]\n}\n]\n'.encode('utf-8'),
+        )
+        self.assertEqual(
+            self._write_bytes('a.ndjson', [{"a": "é"}, {"b": [1]}]),
+            '{"a":"é"}\n{"b":[1]}\n'.encode('utf-8'),
+        )
+        self.assertEqual(self._write_bytes('empty.json', []), b'[]\n')
+        self.assertEqual(self._write_bytes('empty.ndjson', []), b'')
+
+    def test_exact_bytes(self):
+        self._assert_exact_bytes()
+
+    def test_exact_bytes_without_orjson(self):
+        with patch.object(fanout, 'orjson', None):
+            self._assert_exact_bytes()
+
+
+
+class TestInstallPageProbes(unittest.TestCase):
+
+    def test_installs_once_without_running_extractors(self):
+        page = MagicMock()
+
+        fanout.install_page_probes(page)
+        fanout.install_page_probes(page)
+
+        page.context.add_init_script.assert_called_once_with(fanout._PAGE_FUNCTIONS_JS)
+        page.evaluate.assert_called_once()
+        # A function is evaluated, so Playwright only runs the assignments
+        script = page.evaluate.call_args.args[0]
+        self.assertTrue(script.startswith("() => {"))
+        self.assertIn(fanout._PAGE_FUNCTIONS_JS, script)
+
+
+class TestParseRelatedQueries(unittest.TestCase):
+
+    def test_parses_escaped_strings(self):
+        body = (
+            b'data: {"related_queries": ["say \\"hi\\"", "caf\\u00e9 [menu]", "back\\\\slash"]}\n'
+        )
+        self.assertEqual(
+            fanout.parse_related_queries(body),
+            ['say "hi"', 'café [menu]', 'back\\slash'],
+        )
+
+    def test_accepts_str(self):
+        self.assertEqual(fanout.parse_related_queries('{"related_queries":["a"]}'), ['a'])
+
+    def test_skips_empty_and_non_array_values(self):
+        body = b'{"related_queries": null}\n{"related_queries": ["", "  b  "]}'
+        self.assertEqual(fanout.parse_related_queries(body), ['b'])
+
+    def test_truncated_array(self):
+        self.assertEqual(fanout.parse_related_queries(b'{"related_queries": ["a", "b'), ['a'])
+        self.assertEqual(fanout.parse_related_queries(b'{"related_queries": ["a", "b", '), ['a', 'b'])
+
+    def test_dedupes_across_frames(self):
+        body = (
+            b'data: {"related_queries": ["a", "b"]}\n\n'
+            b'data: {"related_queries": ["b", "c"]}\n\n'
+        )
+        self.assertEqual(fanout.parse_related_queries(body), ['a', 'b', 'c'])
+
+    def test_dedupes_across_responses(self):
+        responses = [
+            {'body': b'{"related_queries": ["a", "b"]}'},
+            {'body': '{"related_queries": ["b", "c"]}'},
+            {},
+        ]
+        self.assertEqual(fanout.extract_related_queries_from_sse(responses), ['a', 'b', 'c'])
+
+
+class TestPerplexityCdpCapture(unittest.TestCase):
+
+    def setUp(self):
+        page = MagicMock()
+        self.cdp = page.context.new_cdp_session.return_value
+        self.cdp.send.return_value = {}
+        self.capture = fanout.setup_perplexity_cdp_capture(page)
+        self.handlers = {call.args[0]: call.args[1] for call in self.cdp.on.call_args_list}
+        self.handlers["Network.responseReceived"]({
+            'requestId': 'r1', 'response': {'url': 'https://www.perplexity.ai/rest/sse/perplexity_ask'},
+        })
+
+    def _receive(self, data: bytes):
+        self.handlers["Network.dataReceived"]({'requestId': 'r1', 'data': fanout.base64.b64encode(data).decode()})
+
+    def _signalled(self, flag):
+        return any(flag in str(call) for call in self.cdp.send.call_args_list)
+
+    def test_array_split_across_chunks(self):
+        body = (
+            b'data: ' + b' ' * fanout.SSE_SCAN_STEP
+            + b'{"related_queries": ["first one", "second one", "third one"]}\n\n'
+        )
+        split = body.index(b'"second')
+        self._receive(body[:split])
+        # The array is still open, so the first string alone is not taken
+        self.assertEqual(self.capture['related_queries'], [])
+        self.assertFalse(self._signalled('__sseRelatedReady'))
+
+        self._receive(body[split:])
+        self.handlers["Network.loadingFinished"]({'requestId': 'r1'})
+        self.assertEqual(self.capture['related_queries'], ['first one', 'second one', 'third one'])
+        self.assertTrue(self.capture['done'])
+        self.assertTrue(self._signalled('__sseDone'))
+
+    def test_final_parse_picks_up_later_frames(self):
+        self._receive(b'data: {"related_queries": ["a"]}\n\n' + b' ' * fanout.SSE_SCAN_STEP)
+        self.assertEqual(self.capture['related_queries'], ['a'])
+        self.assertTrue(self._signalled('__sseRelatedReady'))
+
+        self._receive(b'data: {"related_queries": ["a", "b"]}\n\n')
+        self.handlers["Network.loadingFinished"]({'requestId': 'r1'})
+        self.assertEqual(self.capture['related_queries'], ['a', 'b'])
+
+
+class TestSerialization(unittest.TestCase):
+
+    def test_dumps(self):
+        for orjson in (fanout.orjson, None):
+            with self.subTest(orjson=orjson is not None), patch.object(fanout, 'orjson', orjson):
+                self.assertEqual(fanout._dumps({"a": "é"}), '{"a":"é"}'.encode('utf-8'))
+                self.assertEqual(fanout._dumps([1], newline=True), b'[1]\n')
+                self.assertEqual(fanout._dumps({"a": 1}, indent=True), b'{\n  "a": 1\n}')
+
+    def test_slim(self):
+        result = {
+            "service": "chatgpt",
+            "extracted_data": {"response": "abcdefgh", "raw_html": "<html>", "cookies": [], "sources": 3},
+        }
+        slim = fanout._slim(result, max_field_chars=5)
+        self.assertEqual(slim['extracted_data'], {"response": "abcde...<truncated>", "sources": 3})
+        # The original result is left untouched
+        self.assertIn('raw_html', result['extracted_data'])
+
+    def test_slim_without_extracted_data(self):
+        result = {"service": "chatgpt", "success": False}
+        self.assertIs(fanout._slim(result), result)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.cache_dir = os.path.join(self._tmp.name, 'cache')
+        self.result = {"service": "chatgpt", "success": True, "extracted_data": {"response": "x"}}
+
+    def test_round_trip(self):
+        fanout.save_cached_result('chatgpt', 'Query', self.result, self.cache_dir)
+        # Queries differing only in case and surrounding whitespace share an entry
+        self.assertEqual(fanout.load_cached_result('chatgpt', ' query ', 60, self.cache_dir), self.result)
+        self.assertIsNone(fanout.load_cached_result('perplexity', 'query', 60, self.cache_dir))
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(fanout._cache_path('chatgpt', 'query'))])
+
+    def test_failed_results_are_not_cached(self):
+        fanout.save_cached_result('chatgpt', 'query', {"success": False}, self.cache_dir)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_ttl(self):
+        fanout.save_cached_result('chatgpt', 'query', self.result, self.cache_dir)
+        path = fanout._cache_path('chatgpt', 'query', self.cache_dir)
+        hour_ago = fanout.time.time() - 3600
+        os.utime(path, (hour_ago, hour_ago))
+
+        self.assertIsNone(fanout.load_cached_result('chatgpt', 'query', 60, self.cache_dir))
+        self.assertEqual(fanout.load_cached_result('chatgpt', 'query', 7200, self.cache_dir), self.result)
+        self.assertEqual(fanout.load_cached_result('chatgpt', 'query', -1, self.cache_dir), self.result)
+
+    def test_corrupt_entry_is_a_miss(self):
+        os.makedirs(self.cache_dir)
+        with open(fanout._cache_path('chatgpt', 'query', self.cache_dir), 'w') as f:
+            f.write('{"success": tr')
+        self.assertIsNone(fanout.load_cached_result('chatgpt', 'query', -1, self.cache_dir))
+
+
+class TestRetries(unittest.TestCase):
+
+    def test_is_transient(self):
+        self.assertTrue(fanout._is_transient("page.goto: net::ERR_CONNECTION_RESET at https://chatgpt.com/"))
+        self.assertTrue(fanout._is_transient("WebSocket error: ECONNRESET"))
+        self.assertFalse(fanout._is_transient("Failed to submit query to chatgpt"))
+        self.assertFalse(fanout._is_transient(""))
+
+    def _run_worker(self, *errors):
+        results = [
+            {"service": "chatgpt", "success": False, "error": error} if error else {"service": "chatgpt", "success": True}
+            for error in errors
+        ]
+        with patch.object(fanout, 'query_service', side_effect=results) as query_service, \
+                patch.object(fanout.time, 'sleep') as sleep:
+            result = fanout._query_service_in_worker('chatgpt', 'q', None)
+        return result, query_service.call_count, sleep
+
+    def test_retries_transient_errors(self):
+        result, calls, sleep = self._run_worker("net::ERR_TIMED_OUT", None)
+        self.assertTrue(result['success'])
+        self.assertEqual(calls, 2)
+        sleep.assert_called_once_with(fanout.RETRY_BACKOFF_S)
+
+    def test_gives_up_after_max_attempts(self):
+        result, calls, _ = self._run_worker(*["Connection closed"] * fanout.MAX_ATTEMPTS)
+        self.assertEqual(result['error'], "Connection closed")
+        self.assertEqual(calls, fanout.MAX_ATTEMPTS)
+
+    def test_does_not_retry_other_errors(self):
+        result, calls, sleep = self._run_worker("Failed to submit query to chatgpt")
+        self.assertFalse(result['success'])
+        self.assertEqual(calls, 1)
+        sleep.assert_not_called()
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_timed_out_pair_does_not_block_the_rest(self):
+        ran = []
+
+        def fake_worker(service, query, shared_session, cache_ttl, cache_dir):
+            ran.append(service)
+            if service == 'chatgpt':
+                fanout.time.sleep(0.6)
+            return {"service": service, "query": query, "success": True}
+
+        with patch.object(fanout, '_query_service_in_worker', side_effect=fake_worker):
+            results = fanout.asyncio.run(fanout._query_services_concurrently(
+                [('chatgpt', 'q'), ('perplexity', 'q')], 1, None, per_service_timeout=0.2,
+            ))
+
+        self.assertEqual(results[0]['error'], "Timed out after 0.2s")
+        self.assertTrue(results[1]['success'])
+        self.assertEqual(ran, ['chatgpt', 'perplexity'])
+
+    def test_crashed_worker_is_recorded(self):
+        with patch.object(fanout, '_query_service_in_worker', side_effect=RuntimeError("boom")):
+            results = fanout.asyncio.run(fanout._query_services_concurrently([('chatgpt', 'q')], 1, None))
+
+        self.assertFalse(results[0]['success'])
+        self.assertEqual(results[0]['error'], "boom")
+
+
+class TestQueryServices(unittest.TestCase):
+
+    def test_streams_results_through_result_writer(self):
+        def fake_worker(service, query, shared_session, cache_ttl, cache_dir):
+            return {"service": service, "query": query, "success": True,
+                    "extracted_data": {"response": query, "raw_html": "<html>"}}
+
+        seen = []
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(fanout, '_query_service_in_worker', side_effect=fake_worker), \
+                patch.object(fanout, '_SharedBrowserbaseSession'):
+            path = os.path.join(tmp, 'results.ndjson')
+            results = fanout.query_services(
+                {'chatgpt': 'a', 'perplexity': 'b'}, output_file=path, on_result=seen.append,
+            )
+            with open(path) as f:
+                saved = [json.loads(line) for line in f]
+
+        self.assertEqual([r['query'] for r in results], ['a', 'b'])
+        self.assertEqual(sorted(r['query'] for r in seen), ['a', 'b'])
+        self.assertEqual(sorted(r['extracted_data']['response'] for r in saved), ['a', 'b'])
+        # Saved results are slimmed like the fanout's own output
+        self.assertTrue(all('raw_html' not in r['extracted_data'] for r in saved))
+
+
+class TestFanoutReport(unittest.TestCase):
+
+    def test_counts(self):
+        results = {
+            'chatgpt': {"service": "chatgpt", "success": True, "cached": True},
+            'perplexity': {"service": "perplexity", "success": False, "error": "boom"},
+        }
+
+        def fake_worker(service, query, shared_session, cache_ttl, cache_dir):
+            return dict(results[service], query=query)
+
+        with patch.object(fanout, '_query_service_in_worker', side_effect=fake_worker), \
+                patch.object(fanout, '_SharedBrowserbaseSession'):
+            report = fanout.fanout_query('q', services=['chatgpt', 'perplexity'], quiet=True)
+
+        self.assertEqual([r['service'] for r in report.results], ['chatgpt', 'perplexity'])
+        self.assertEqual((report.successful, report.failed, report.cache_hits), (1, 1, 1))
+        self.assertGreaterEqual(report.duration_s, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()